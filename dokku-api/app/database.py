@@ -1,9 +1,15 @@
 import logging
 import os
+import time
 
 from dotenv import load_dotenv
 from ksuid import Ksuid
-from sqlmodel import create_engine, Session, SQLModel
+from migrations import run_migrations
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlmodel import create_engine, SQLModel
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import timing_utils
 
 # ======================================================= Config
 logger = logging.getLogger(__name__)
@@ -13,30 +19,101 @@ load_dotenv()
 
 # Define the SQLite database URL
 DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///dokku-api.db")
+ASYNC_DATABASE_URL = os.getenv("ASYNC_DATABASE_URL", DATABASE_URL.replace("sqlite://", "sqlite+aiosqlite://", 1))
 
-# Create the database engine
+# SQLite tuning, applied to every new connection
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")  # WAL lets readers run alongside a writer
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")  # safe with WAL, avoids an fsync per commit
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))  # wait on locks instead of failing immediately
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# Create the database engines, the sync one is only used for schema setup at startup
 engine = create_engine(DATABASE_URL)
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_POOL_SIZE,
+    max_overflow=DB_MAX_OVERFLOW,
+    pool_timeout=DB_POOL_TIMEOUT,
+    pool_pre_ping=True,
+)
+
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """
+    Apply the SQLite tuning pragmas to a new connection.
+    """
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
+
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    """
+    Stamp a query with its start time. The stamp lives on the query's own execution context, so one that
+    fails, and never reaches after_cursor_execute, leaves nothing behind to skew the next query's time.
+    """
+    if context is not None:
+        context.query_started_at = time.perf_counter()
+
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started_at = getattr(context, "query_started_at", None)
+    if started_at is not None:
+        timing_utils.record("db", time.perf_counter() - started_at)
+
+
+if DATABASE_URL.startswith("sqlite"):
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
+    event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+
+# time queries made while serving requests for the Server-Timing header
+event.listen(async_engine.sync_engine, "before_cursor_execute", _start_query_timer)
+event.listen(async_engine.sync_engine, "after_cursor_execute", _record_query_time)
 
 
 # ============================================================= Database setup
 def initialize_database():
     """
     Initialize the database using SQLModel.
-    Creates all tables if they don't exist.
+    Creates all tables if they don't exist, then applies any pending schema migrations.
     """
     try:
         logger.info("Initializing sqlite database")
         SQLModel.metadata.create_all(engine)
+        run_migrations(engine)
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {str(e)}")
 
 
-def get_session():
+async def dispose_engines():
+    """
+    Close all pooled database connections. Called on shutdown.
+    """
+    await async_engine.dispose()
+    engine.dispose()
+
+
+def create_session() -> AsyncSession:
+    """
+    Create an async session for use outside of a request, e.g. in background workers.
+
+    Objects aren't expired on commit so they can still be read afterwards without another query.
+    """
+    return AsyncSession(async_engine, expire_on_commit=False)
+
+
+async def get_session():
     """
     Get a session for the database.
     """
-    with Session(engine) as session:
+    async with create_session() as session:
         yield session
 
 
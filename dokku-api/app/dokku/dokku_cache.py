@@ -0,0 +1,87 @@
+import time
+from collections import OrderedDict
+from typing import Any, NamedTuple, Optional
+
+# Returned by TTLCache.get on a miss, so falsy values can still be cached
+MISSING = object()
+
+
+class _CacheEntry(NamedTuple):
+    value: Any
+    expires_at: float
+    app_name: Optional[str]
+
+
+# ======================================================= Cache
+class TTLCache:
+    """
+    Bounded in-memory cache with per-entry TTLs and LRU eviction.
+
+    Entries can be tagged with the app they describe so mutations can invalidate them.
+    Entries without an app (e.g. apps:list) describe the whole fleet and are dropped on any app invalidation.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, _CacheEntry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.generation = 0  # bumped on every invalidation so in-flight reads can tell they may be stale
+
+    def get(self, key: str) -> Any:
+        """
+        Get a cached value, or MISSING if absent or expired.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return MISSING
+
+        if entry.expires_at <= time.monotonic():
+            del self._entries[key]
+            self.misses += 1
+            return MISSING
+
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry.value
+
+    def set(self, key: str, value: Any, ttl: float, app_name: Optional[str] = None):
+        """
+        Cache a value for ttl seconds, evicting the least recently used entries if full.
+        """
+        self._entries[key] = _CacheEntry(value, time.monotonic() + ttl, app_name)
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def invalidate_app(self, app_name: str):
+        """
+        Drop every entry describing the given app, plus fleet-wide entries.
+        """
+        stale_keys = [key for key, entry in self._entries.items() if entry.app_name in (app_name, None)]
+        for key in stale_keys:
+            del self._entries[key]
+        self.invalidations += len(stale_keys)
+        self.generation += 1
+
+    def clear(self):
+        self.invalidations += len(self._entries)
+        self._entries.clear()
+        self.generation += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+        }
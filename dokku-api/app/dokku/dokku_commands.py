@@ -1,32 +1,78 @@
+import asyncio
 import logging
+import os
+import time
 
-from dokku import dokku_client, dokku_parser
+from dokku import dokku_cache, dokku_client, dokku_parser
+from dotenv import load_dotenv
 from exceptions import DokkuCommandError, DokkuParseError, DokkuPluginNotSupportedError
 from models import DokkuResponse
+from utils import metrics_utils, timing_utils
 
 # ======================================================= Config
 logger = logging.getLogger(__name__)
 
+load_dotenv()
+
 SUPPORTED_DATABASE_PLUGINS = ["postgres", "mysql"]
 
+# Output format for single-app reports, "json" needs a dokku version whose report commands support --format json
+DOKKU_REPORT_FORMAT = os.getenv("DOKKU_REPORT_FORMAT", "stdout")
+
+# Cache TTLs in seconds for read-only commands, keyed by command verb. Set to 0 to disable caching for a command.
+CACHE_TTLS = {
+    "apps:list": float(os.getenv("DOKKU_CACHE_TTL_APPS_LIST", "5")),
+    "apps:report": float(os.getenv("DOKKU_CACHE_TTL_APPS_REPORT", "10")),
+    "ps:report": float(os.getenv("DOKKU_CACHE_TTL_PS_REPORT", "5")),
+    "domains:report": float(os.getenv("DOKKU_CACHE_TTL_DOMAINS_REPORT", "30")),
+}
+
+# Default timeouts in seconds by command class: reads answer quickly, builds and (re)starts run health checks for minutes
+COMMAND_TIMEOUTS = {
+    "read": float(os.getenv("DOKKU_TIMEOUT_READ", "15")),
+    "write": float(os.getenv("DOKKU_TIMEOUT_WRITE", "60")),
+    "build": float(os.getenv("DOKKU_TIMEOUT_BUILD", "600")),
+}
+FLEET_READ_TIMEOUT = float(os.getenv("DOKKU_TIMEOUT_FLEET_READ", "120"))  # reports covering every app grow with the host
+BUILD_VERBS = {"ps:rebuild", "ps:restart", "ps:start", "ps:restore", "git:sync", "git:from-image", "git:from-archive"}
+READ_VERBS = {"apps:list", "plugin:list", "version", "logs"}
+
+_cache = dokku_cache.TTLCache(max_size=int(os.getenv("DOKKU_CACHE_MAX_SIZE", "512")))
+
+# Callbacks told about apps that may have changed: called with the app name, or None when any app may have changed
+_change_listeners = []
+
+# Read commands currently running against the daemon, keyed by command, so identical concurrent reads share one call.
+# Each entry is [task, number of callers waiting on it].
+_in_flight = {}
+
 
 # ======================================================= Apps
-async def list_apps():
+async def list_apps(fresh: bool = False):
     """
-    List all Dokku apps.
+    List all Dokku apps, skipping the cache if fresh is set.
     """
     command = "apps:list"
     parser_func = dokku_parser.parse_apps_list
-    return await _execute(command, parser_func)
+    return await _execute(command, parser_func, read_only=True, fresh=fresh)
 
 
-async def get_app_report(app_name: str):
+async def get_app_report(app_name: str, fresh: bool = False):
     """
-    Get a Dokku app report.
+    Get a Dokku app report, skipping the cache if fresh is set.
     """
-    command = f"apps:report {app_name}"
-    parser_func = dokku_parser.parse_report
-    return await _execute(command, parser_func)
+    command = _report_command("apps:report", app_name)
+    parser_func = dokku_parser.parse_json_report if DOKKU_REPORT_FORMAT == "json" else dokku_parser.parse_report
+    return await _execute(command, parser_func, app_name=app_name, read_only=True, fresh=fresh)
+
+
+async def get_all_app_reports(fresh: bool = False):
+    """
+    Get Dokku app reports for every app in a single command, keyed by app name, skipping the cache if fresh is set.
+    """
+    command = "apps:report"
+    parser_func = dokku_parser.parse_reports
+    return await _execute(command, parser_func, read_only=True, fresh=fresh)
 
 
 async def create_app(app_name: str):
@@ -34,7 +80,7 @@ async def create_app(app_name: str):
     Create a new Dokku app.
     """
     command = f"apps:create {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def restart_app(app_name: str):
@@ -42,7 +88,7 @@ async def restart_app(app_name: str):
     Restart a Dokku app.
     """
     command = f"ps:restart {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def rebuild_app(app_name: str):
@@ -52,7 +98,16 @@ async def rebuild_app(app_name: str):
     NOTE: This command can take a long time to complete. Best run as a background task.
     """
     command = f"ps:rebuild {app_name}"
-    return await _execute(command, timeout=600.0)  # 10 minute timeout for builds
+    return await _execute(command, app_name=app_name)
+
+
+async def stream_rebuild_app(app_name: str):
+    """
+    Rebuild a Dokku app, yielding progress events as it runs.
+    """
+    command = f"ps:rebuild {app_name}"
+    async for event in _execute_stream(command, app_name=app_name):
+        yield event
 
 
 async def start_app(app_name: str):
@@ -60,7 +115,7 @@ async def start_app(app_name: str):
     Start a Dokku app.
     """
     command = f"ps:start {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def stop_app(app_name: str):
@@ -68,7 +123,7 @@ async def stop_app(app_name: str):
     Stop a Dokku app.
     """
     command = f"ps:stop {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def destroy_app(app_name: str):
@@ -76,26 +131,46 @@ async def destroy_app(app_name: str):
     Permanently delete a Dokku app.
     """
     command = f"--force apps:destroy {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
-async def sync_app_from_git_url(app_name: str, git_url: str):
+async def sync_app_from_git_url(app_name: str, git_url: str, git_ref: str = None):
     """
-    Sync a Dokku app from a git repository. Url must include authentication.
+    Sync a Dokku app from a git repository, optionally at a specific branch, tag or commit. Url must include authentication.
 
     NOTE: This command can take a long time to complete. Best run as a background task.
     """
     command = f"git:sync --build-if-changes {app_name} {git_url}"
-    return await _execute(command, timeout=600.0)  # 10 minute timeout for syncs
+    if git_ref:
+        command = f"{command} {git_ref}"
+    return await _execute(command, app_name=app_name)
+
+
+async def stream_sync_app_from_git_url(app_name: str, git_url: str):
+    """
+    Sync a Dokku app from a git repository, yielding progress events as it runs. Url must include authentication.
+    """
+    command = f"git:sync --build-if-changes {app_name} {git_url}"
+    async for event in _execute_stream(command, app_name=app_name):
+        yield event
+
+
+async def app_domains_report(app_name: str, fresh: bool = False):
+    """
+    Get a report on the domains for a given app, skipping the cache if fresh is set.
+    """
+    command = _report_command("domains:report", app_name)
+    parser_func = dokku_parser.parse_json_report if DOKKU_REPORT_FORMAT == "json" else dokku_parser.parse_report
+    return await _execute(command, parser_func, app_name=app_name, read_only=True, fresh=fresh)
 
 
-async def app_domains_report(app_name: str):
+async def get_all_domains_reports(fresh: bool = False):
     """
-    Get a report on the domains for a given app.
+    Get domain reports for every Dokku app in a single command, keyed by app name, skipping the cache if fresh is set.
     """
-    command = f"domains:report {app_name}"
-    parser_func = dokku_parser.parse_report
-    return await _execute(command, parser_func)
+    command = "domains:report"
+    parser_func = dokku_parser.parse_reports
+    return await _execute(command, parser_func, read_only=True, fresh=fresh)
 
 
 async def set_app_build_dir(app_name: str, build_dir: str):
@@ -103,7 +178,7 @@ async def set_app_build_dir(app_name: str, build_dir: str):
     Set the build directory for a Dokku app.
     """
     command = f"builder:set {app_name} build-dir {build_dir}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def set_app_git_branch(app_name: str, branch_name: str):
@@ -111,7 +186,7 @@ async def set_app_git_branch(app_name: str, branch_name: str):
     Set the git branch to deploy for a Dokku app.
     """
     command = f"git:set {app_name} deploy-branch {branch_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 async def enable_lets_encrypt(app_name: str):
@@ -119,26 +194,37 @@ async def enable_lets_encrypt(app_name: str):
     Enable Let's Encrypt for a Dokku app.
     """
     command = f"letsencrypt:enable {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
 
 
 # ======================================================= Processes
-async def get_app_process_report(app_name: str):
+async def get_app_process_report(app_name: str, fresh: bool = False):
+    """
+    Get process report for a Dokku app, skipping the cache if fresh is set.
     """
-    Get process report for a Dokku app.
+    command = _report_command("ps:report", app_name)
+    parser_func = dokku_parser.parse_json_process_report if DOKKU_REPORT_FORMAT == "json" else dokku_parser.parse_process_report
+    return await _execute(command, parser_func, app_name=app_name, read_only=True, fresh=fresh)
+
+
+async def get_all_process_reports(fresh: bool = False):
+    """
+    Get process reports for every Dokku app in a single command, keyed by app name, skipping the cache if fresh is set.
+
+    Unlike get_app_process_report the reports have no "process_list", see dokku_parser.with_process_list.
     """
-    command = f"ps:report {app_name}"
-    parser_func = dokku_parser.parse_report
-    return await _execute(command, parser_func)
+    command = "ps:report"
+    parser_func = dokku_parser.parse_reports
+    return await _execute(command, parser_func, read_only=True, fresh=fresh)
 
 
 # ======================================================= Logs
-async def get_app_logs(app_name: str):
+async def get_app_logs(app_name: str, num_lines: int = None):
     """
-    Get logs for a Dokku app.
+    Get logs for a Dokku app, optionally limited to the last num_lines lines.
     """
-    command = f"logs {app_name}"
-    return await _execute(command)
+    command = f"logs {app_name}" if num_lines is None else f"logs {app_name} --num {num_lines}"
+    return await _execute(command, app_name=app_name, read_only=True)
 
 
 # ======================================================= Plugins
@@ -147,7 +233,8 @@ async def list_plugins():
     List all Dokku plugins.
     """
     command = "plugin:list"
-    return await _execute(command)
+    parser_func = dokku_parser.parse_plugin_list
+    return await _execute(command, parser_func, read_only=True)
 
 
 async def install_plugin(plugin_name: str):
@@ -180,18 +267,122 @@ async def link_database(plugin_name: str, database_name: str, app_name: str):
     """
     _ensure_database_supported(plugin_name)
     command = f"{plugin_name}:link {database_name} {app_name}"
-    return await _execute(command)
+    return await _execute(command, app_name=app_name)
+
+
+# ======================================================= System
+async def get_version(timeout: float = None):
+    """
+    Get the Dokku version, a cheap command used to check the daemon is answering.
+    """
+    command = "version"
+    return await _execute(command, timeout=timeout, read_only=True)
+
+
+# ======================================================= Cache
+def get_cache_stats():
+    """
+    Get hit/miss counters and size of the read cache.
+    """
+    return {**_cache.stats(), "ttls": CACHE_TTLS}
+
+
+def clear_cache():
+    """
+    Drop every cached read.
+    """
+    _cache.clear()
+
+
+def invalidate_app_cache(app_name: str):
+    """
+    Drop cached reads for an app, e.g. after it was changed outside of these commands.
+    """
+    _app_changed(app_name)
+
+
+def invalidate_cache_for_command(command: str):
+    """
+    Drop cached reads after an arbitrary command was sent to the daemon, unless it is a read-only command.
+    """
+    if command_class(command) != "read":
+        _cache.clear()
+        _notify_change(None)
+
+
+def add_change_listener(listener: callable):
+    """
+    Register a callback called with an app's name after a command may have changed it, or None if it could be any app.
+    """
+    _change_listeners.append(listener)
+
+
+def _app_changed(app_name: str):
+    _cache.invalidate_app(app_name)
+    _notify_change(app_name)
+
+
+def _notify_change(app_name: str = None):
+    for listener in _change_listeners:
+        listener(app_name)
 
 
 # ======================================================= Execution
-async def _execute(command: str, parser_func: callable = None, timeout: float = 60.0):
+def command_class(command: str, read_only: bool = False) -> str:
+    """
+    Classify a command as "build" for builds, syncs and (re)starts, "read" for reports, lists and other
+    read-only commands, or "write" for everything else.
+    """
+    verb = dokku_client.command_verb(command)
+    if verb in BUILD_VERBS:
+        return "build"
+    if read_only or verb in READ_VERBS or verb in CACHE_TTLS or verb.endswith(":report"):
+        return "read"
+    return "write"
+
+
+def is_fleet_read(command: str) -> bool:
+    """
+    Check whether a command is a report without an app name, which covers every app on the host.
+    """
+    parts = [part for part in command.split() if not part.startswith("--")]
+    return len(parts) == 1 and parts[0].endswith(":report")
+
+
+def counts_timeouts(command: str) -> bool:
+    """
+    Check whether a command timing out counts towards the circuit breaker. Fleet-wide reports grow with the
+    host and builds with the app, so their timeouts say more about those than about the daemon's health.
+    """
+    return not is_fleet_read(command) and command_class(command) != "build"
+
+
+def command_timeout(command: str, read_only: bool = False) -> float:
+    """
+    Get the default timeout for a command from its class, or FLEET_READ_TIMEOUT for fleet-wide reports.
+    """
+    if is_fleet_read(command):
+        return FLEET_READ_TIMEOUT
+    return COMMAND_TIMEOUTS[command_class(command, read_only)]
+
+
+async def _execute(command: str, parser_func: callable = None, timeout: float = None, app_name: str = None, read_only: bool = False, fresh: bool = False):
     """
     Execute a Dokku command and optionally parse its data.
 
+    Read-only commands are served from the cache when a TTL is configured for their verb, and identical
+    read-only commands running concurrently are coalesced into a single daemon call.
+    Any other command is never cached or coalesced; if it names an app it invalidates that app's cached reads,
+    whether or not it succeeds.
+
     Args:
         command (str): The Dokku command to execute.
         parser_func (callable, optional): The function to parse the command data.
-        timeout (float, optional): Maximum time to wait for response in seconds. Defaults to 60.0.
+        timeout (float, optional): Maximum time to wait for response in seconds. Defaults to the command class's timeout.
+        app_name (str, optional): The app the command reads or changes, used to tag and invalidate cache entries.
+        read_only (bool, optional): Whether the command only reads state. Defaults to False.
+        fresh (bool, optional): Skip the cache for a read-only command, still caching the result. A call already
+            in flight is still joined, its answer is no older than the daemon's latency. Defaults to False.
 
     Returns:
         The parsed output of the command or the raw output if no parser is provided.
@@ -200,13 +391,107 @@ async def _execute(command: str, parser_func: callable = None, timeout: float =
         DokkuCommandError: If the command execution fails.
         DokkuParseError: If the output parsing fails.
     """
-    response = await dokku_client.execute(command, timeout=timeout)
-    _validate_response(response)
+    if timeout is None:
+        timeout = command_timeout(command, read_only)
+
+    if not read_only:
+        try:
+            return await _execute_uncached(command, parser_func, timeout)
+        finally:
+            if app_name:
+                _app_changed(app_name)
+
+    ttl = CACHE_TTLS.get(dokku_client.command_verb(command), 0)
+    if ttl > 0 and not fresh:
+        cached = _cache.get(command)
+        if cached is not dokku_cache.MISSING:
+            return cached
+
+    return await _execute_coalesced(command, parser_func, timeout, app_name, ttl)
+
+
+async def _execute_coalesced(command: str, parser_func: callable, timeout: float, app_name: str, ttl: float):
+    """
+    Execute a read-only command, joining an identical call already in flight instead of starting another.
+
+    The daemon call runs in its own task so a caller being cancelled doesn't fail the other callers waiting on it,
+    and is only cancelled once every caller has been.
+    """
+    entry = _in_flight.get(command)
+    if entry is None:
+        task = asyncio.ensure_future(_execute_and_cache(command, parser_func, timeout, app_name, ttl))
+        entry = _in_flight[command] = [task, 0]
+        task.add_done_callback(lambda done: _forget_in_flight(command, done))
+    else:
+        logger.debug(f"Joining in-flight dokku command: {command}")
+
+    task = entry[0]
+    entry[1] += 1
+    try:
+        return await asyncio.shield(task)
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0 and not task.done():
+            # every caller was cancelled, e.g. their clients disconnected, so stop holding a daemon connection for nobody
+            # forget it first, a caller arriving before the cancellation lands must start a new call, not join this one
+            logger.debug(f"Cancelling in-flight dokku command with no callers left: {command}")
+            if _in_flight.get(command) is entry:
+                del _in_flight[command]
+            task.cancel()
+
+
+async def _execute_and_cache(command: str, parser_func: callable, timeout: float, app_name: str, ttl: float):
+    """
+    Execute a read-only command and cache its result, unless the cache was invalidated while it ran.
+    """
+    generation = _cache.generation
+    result = await _execute_uncached(command, parser_func, timeout, read_only=True)
+    if ttl > 0 and _cache.generation == generation:
+        _cache.set(command, result, ttl, app_name=app_name)
+    return result
+
+
+def _forget_in_flight(command: str, task: asyncio.Task):
+    """
+    Remove a finished read from the in-flight table, retrieving its exception in case every caller went away.
+    """
+    entry = _in_flight.get(command)
+    if entry is not None and entry[0] is task:
+        del _in_flight[command]
+    if not task.cancelled():
+        task.exception()
 
-    if parser_func is None:
-        return response.data.get("output")
 
-    return _parse_output(response, command, parser_func)
+async def _execute_uncached(command: str, parser_func: callable = None, timeout: float = None, read_only: bool = False):
+    """
+    Execute a Dokku command against the daemon and optionally parse its data.
+
+    Only read-only commands are resent if the connection drops.
+    """
+    response = await dokku_client.execute(
+        command, timeout=timeout or command_timeout(command), count_timeouts=counts_timeouts(command), idempotent=read_only
+    )
+    try:
+        _validate_response(response)
+
+        if parser_func is None:
+            return response.data.get("output")
+
+        return _parse_output(response, command, parser_func)
+    except (DokkuCommandError, DokkuParseError) as e:
+        metrics_utils.DOKKU_COMMAND_FAILURES.inc(dokku_client.metric_verb(command), type(e).__name__)
+        raise
+
+
+async def _execute_stream(command: str, app_name: str, timeout: float = None):
+    """
+    Execute a mutating Dokku command in streaming mode, invalidating the app's cached reads once it ends.
+    """
+    try:
+        async for event in dokku_client.execute_stream(command, timeout=timeout or command_timeout(command), count_timeouts=counts_timeouts(command)):
+            yield event
+    finally:
+        _app_changed(app_name)
 
 
 def _validate_response(response: DokkuResponse):
@@ -249,14 +534,28 @@ def _parse_output(response: DokkuResponse, command: str, parser_func: callable):
     Raises:
         DokkuParseError: If the output parsing fails.
     """
+    started_at = time.perf_counter()
     try:
         return parser_func(response.data.get("output"))  # dokku output is nested in "output" key
     except Exception as e:
         logger.error(f"Failed to parse Dokku output for command: {command}: {str(e)}")
         raise DokkuParseError(f"Failed to parse Dokku output for command: {command}: {str(e)}")
+    finally:
+        elapsed = time.perf_counter() - started_at
+        metrics_utils.DOKKU_PARSE_SECONDS.observe(elapsed, dokku_client.metric_verb(command))
+        timing_utils.record("parse", elapsed)
 
 
 # ======================================================= Helpers
+def _report_command(verb: str, app_name: str) -> str:
+    """
+    Build a single-app report command in the configured output format.
+    """
+    if DOKKU_REPORT_FORMAT == "json":
+        return f"{verb} {app_name} --format json"
+    return f"{verb} {app_name}"
+
+
 def _ensure_database_supported(plugin_name: str):
     """
     Ensure the database plugin is supported.
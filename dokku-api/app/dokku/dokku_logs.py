@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import os
+from collections import deque
+from contextlib import asynccontextmanager
+
+from dokku import dokku_commands
+from dotenv import load_dotenv
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+LOG_TAIL_BUFFER_LINES = int(os.getenv("LOG_TAIL_BUFFER_LINES", "500"))  # lines kept per app and replayed to new viewers
+LOG_TAIL_POLL_INTERVAL = float(os.getenv("LOG_TAIL_POLL_INTERVAL", "2"))  # seconds between upstream log fetches
+LOG_TAIL_SUBSCRIBER_QUEUE = int(os.getenv("LOG_TAIL_SUBSCRIBER_QUEUE", "1000"))  # events buffered per slow viewer
+
+# Lines compared before an anchor line when working out where new log output starts
+OVERLAP_CONTEXT_LINES = 5
+
+
+# ======================================================= Log tail
+class LogTail:
+    """
+    Shared live tail of one app's logs.
+
+    A single upstream poller fetches the app's latest log lines, keeps them in a bounded ring buffer and
+    fans new lines out to every subscriber. The poller stops when the last subscriber leaves.
+    """
+
+    def __init__(self, app_name: str, buffer_size: int):
+        self.app_name = app_name
+        self.buffer = deque(maxlen=buffer_size)
+        self.subscribers = set()
+        self._task = None
+
+    def add_subscriber(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=LOG_TAIL_SUBSCRIBER_QUEUE)
+        for line in self.buffer:
+            queue.put_nowait({"event": "log", "line": line})
+        self.subscribers.add(queue)
+
+        if self._task is None:
+            logger.info(f"Starting log tail for app: {self.app_name}")
+            self._task = asyncio.ensure_future(self._run())
+        return queue
+
+    def remove_subscriber(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+        if not self.subscribers and self._task is not None:
+            logger.info(f"Stopping log tail for app: {self.app_name}")
+            self._task.cancel()
+            self._task = None
+
+    def publish(self, event: dict):
+        """
+        Push an event to every subscriber, dropping a slow subscriber's oldest event rather than blocking the tail.
+        """
+        for queue in self.subscribers:
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(event)
+
+    async def _run(self):
+        while True:
+            try:
+                output = await dokku_commands.get_app_logs(self.app_name, num_lines=self.buffer.maxlen)
+                for line in _new_lines(self.buffer, output.splitlines()):
+                    self.buffer.append(line)
+                    self.publish({"event": "log", "line": line})
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Failed to fetch logs for app: {self.app_name}: {str(e)}")
+                self.publish({"event": "error", "error": str(e)})
+
+            await asyncio.sleep(LOG_TAIL_POLL_INTERVAL)
+
+
+_tails = {}
+
+
+@asynccontextmanager
+async def subscribe(app_name: str):
+    """
+    Subscribe to an app's live logs. Yields a queue of events, starting with the buffered lines.
+    """
+    tail = _tails.get(app_name)
+    if tail is None:
+        tail = _tails[app_name] = LogTail(app_name, LOG_TAIL_BUFFER_LINES)
+
+    queue = tail.add_subscriber()
+    try:
+        yield queue
+    finally:
+        tail.remove_subscriber(queue)
+        if not tail.subscribers:
+            _tails.pop(app_name, None)
+
+
+async def stream_app_logs(app_name: str):
+    """
+    Yield log events for an app until the consumer stops iterating.
+    """
+    async with subscribe(app_name) as queue:
+        while True:
+            yield await queue.get()
+
+
+# ======================================================= Helpers
+def _new_lines(previous: deque, lines: list) -> list:
+    """
+    Get the lines of a fresh log fetch that come after what was already seen.
+
+    Looks for the last line seen (checking a few lines of context before it) from the end of the fetch;
+    if it isn't found the logs rolled past the fetch window and every line is new.
+    """
+    if not previous:
+        return lines
+
+    last_line = previous[-1]
+    for index in range(len(lines) - 1, -1, -1):
+        if lines[index] == last_line and _context_matches(previous, lines, index):
+            return lines[index + 1 :]
+
+    return lines
+
+
+def _context_matches(previous: deque, lines: list, index: int) -> bool:
+    context = min(OVERLAP_CONTEXT_LINES, index, len(previous) - 1)
+    for offset in range(1, context + 1):
+        if lines[index - offset] != previous[-1 - offset]:
+            return False
+    return True
@@ -1,23 +1,177 @@
+import json
+import re
+from typing import Optional
+
+from models import DokkuPlugin, DokkuProcess
+
+# ======================================================= Line kinds
+# Lines are classified by their leading marker once stripped, anything else is a "key: value" pair or plain text
+LINE_MARKERS = {
+    "=====>": "header",  # "=====> node-js-app app information"
+    "----->": "header",  # "-----> Plugin Version Information"
+    "!": "notice",  # "!     You haven't deployed any applications yet"
+}
+MARKER_CHARS = "".join({marker[0] for marker in LINE_MARKERS})
+
+# Value patterns for specific output shapes, compiled once
+PLUGIN_PATTERN = re.compile(r"^[ \t]*(\S+)[ \t]+(\S+)[ \t]+(enabled|disabled)\b[ \t]*(.*?)[ \t]*$", re.MULTILINE)  # "  postgres  1.41.0 enabled  dokku postgres service plugin"
+PROCESS_KEY_PATTERN = re.compile(r"^status_(.+)_(\d+)$")  # "status_web_1"
+PROCESS_VALUE_PATTERN = re.compile(r"^(\S+)(?:\s+\(CID:\s*(\w+)\))?")  # "running (CID: 3a6d9e6d0e9)"
+
+
+# ======================================================= Lines
+def line_marker(line: str) -> Optional[str]:
+    """
+    Get the kind of marker a stripped line starts with ("header" or "notice"), or None for "key: value" pairs and plain text.
+    """
+    if line[0] in MARKER_CHARS:
+        for marker, kind in LINE_MARKERS.items():
+            if line.startswith(marker):
+                return kind
+    return None
+
+
+def normalize_key(key: str) -> str:
+    """
+    Turn a report label into a dictionary key, e.g. "Ps restart policy" -> "ps_restart_policy".
+    """
+    return key.lower().replace(" ", "_")
+
+
+# ======================================================= Parsers
 def parse_apps_list(dokku_output):
     """
-    Transform the Dokku apps:list output into an array of app names.
+    Transform the Dokku apps:list output into an array of app names, skipping headers, notices and blank lines.
+
+    Dokku app names are lowercase letters, digits and dashes, so lines starting with a marker character or holding
+    a ":" (e.g. "Deprecated: ..." printed by dokku or a plugin among the names) are never app names. Every marker
+    holds a "!" or ">", so lines are only checked one by one if the output past its header holds one of those
+    or a ":", keeping the usual header and one name per line as cheap as splitting it.
     """
-    lines = dokku_output.strip().split("\n")
-    apps = [app.strip() for app in lines[1:] if app.strip()]
-    return apps
+    body = dokku_output.lstrip()
+    if body and line_marker(body) == "header":
+        body = body.partition("\n")[2]  # "=====> My Apps"
+
+    app_names = [line for line in map(str.strip, body.split("\n")) if line]
+    if ":" in body or "!" in body or ">" in body:
+        app_names = [line for line in app_names if line[0] not in MARKER_CHARS and ":" not in line]
+    return app_names
 
 
 def parse_report(dokku_output):
     """
     Transform a Dokku report output into a dictionary of information.
+
+    Lines that aren't "key: value" pairs are skipped. If the output covers several apps, the first app's report is returned.
+    """
+    reports = parse_reports(dokku_output)
+    return next(iter(reports.values()), {})
+
+
+def parse_reports(dokku_output):
+    """
+    Transform a Dokku report output covering several apps into a dictionary of reports keyed by app name.
+
+    Dokku emits one "=====> <app> <kind> information" header per app when a report command is run without an app name.
+    Output without a header is returned under an empty app name.
+
+    This is on the path of every report read and snapshot sweep, so lines are split in a single loop with the
+    marker check only run on lines starting with a marker character.
+    """
+    reports = {}
+    report = None
+
+    for line in dokku_output.splitlines():
+        key, separator, value = line.partition(":")
+        key = key.strip()
+        if not key:
+            continue
+
+        if key[0] in MARKER_CHARS:  # a header or notice may contain a colon itself, so classify the whole line
+            text = line.strip()
+            kind = line_marker(text)
+            if kind == "header":
+                app_name = (text.lstrip("=->").split() or [""])[0]
+                report = reports.setdefault(app_name, {})
+            if kind is not None:
+                continue
+
+        if separator:
+            if report is None:
+                report = reports.setdefault("", {})
+            report[key.lower().replace(" ", "_")] = value.strip()
+
+    return reports
+
+
+def parse_process_report(dokku_output):
+    """
+    Transform a Dokku ps:report output into a dictionary of information, plus a "process_list" of its containers.
+
+    Fleet-wide ps:report output is parsed with parse_reports alone, building every app's process list up front
+    costs several times the parse itself; with_process_list adds it to a single app's report when it is served.
+    """
+    return with_process_list(parse_report(dokku_output))
+
+
+def parse_json_report(dokku_output):
+    """
+    Transform the output of a report command run with --format json into a dictionary of information.
+
+    Keys and values are normalized to match the plain text report, so callers see the same shape either way.
+    """
+    data = json.loads(dokku_output)
+    return {normalize_key(key.strip()).replace("-", "_"): _report_value(value) for key, value in data.items()}
+
+
+def parse_json_process_report(dokku_output):
     """
-    lines = dokku_output.strip().split("\n")
-    report = {}
+    Transform the output of ps:report --format json into a dictionary of information, plus a "process_list".
+    """
+    return with_process_list(parse_json_report(dokku_output))
+
 
-    for line in lines[1:]:  # Skip the first line (header)
-        key, value = line.split(":", 1)
-        key = key.strip().lower().replace(" ", "_")
-        value = value.strip()
-        report[key] = value
+def parse_plugin_list(dokku_output):
+    """
+    Transform the Dokku plugin:list output into a list of plugins.
+    """
+    return [
+        DokkuPlugin(name=name, version=version, enabled=state == "enabled", description=description)
+        for name, version, state, description in PLUGIN_PATTERN.findall(dokku_output)
+    ]
 
+
+# ======================================================= Helpers
+def with_process_list(report: dict) -> dict:
+    """
+    Add the containers listed in a process report's "status_<type>_<n>" entries as a "process_list".
+    """
+    processes = []
+    for key, value in report.items():
+        key_match = PROCESS_KEY_PATTERN.match(key) if key.startswith("status_") else None
+        if not key_match:
+            continue
+
+        value_match = PROCESS_VALUE_PATTERN.match(value)
+        processes.append(
+            DokkuProcess.model_construct(  # values are already the right types, skip validation on this hot path
+                process_type=key_match.group(1),
+                index=int(key_match.group(2)),
+                status=value_match.group(1) if value_match else value,
+                container_id=value_match.group(2) if value_match else None,
+            )
+        )
+
+    report["process_list"] = processes
     return report
+
+
+def _report_value(value) -> str:
+    """
+    Render a json report value the way the plain text report shows it, e.g. True -> "true".
+    """
+    if isinstance(value, bool):
+        return "true" if value else "false"
+    if value is None:
+        return ""
+    return str(value)
@@ -1,3 +1,5 @@
+import math
+
 from fastapi import Request, status
 from fastapi.responses import JSONResponse
 
@@ -41,6 +43,16 @@ class DokkuPluginNotSupportedError(DokkuError):
     pass
 
 
+class DokkuUnavailableError(DokkuError):
+    """
+    Exception for commands refused without contacting the daemon, because its circuit breaker is open
+    """
+
+    def __init__(self, message: str, retry_after: float = 0.0):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
 # ======================================================= Exception handlers
 def generic_exception_handler(request: Request, err: Exception):
     """
@@ -90,3 +102,14 @@ def dokku_plugin_not_supported_exception_handler(request: Request, ex: DokkuPlug
     DokkuPluginNotSupportedError - handles unsupported Dokku plugins
     """
     return JSONResponse(status_code=400, content={"error": "Dokku Plugin Not Supported", "message": str(ex)})
+
+
+def dokku_unavailable_exception_handler(request: Request, ex: DokkuUnavailableError):
+    """
+    DokkuUnavailableError - the daemon is down or wedged, tells clients when it will next be tried
+    """
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"error": "Dokku Daemon Unavailable", "message": str(ex)},
+        headers={"Retry-After": str(max(1, math.ceil(ex.retry_after)))},
+    )
@@ -2,23 +2,26 @@ import logging
 import os
 from contextlib import asynccontextmanager
 
-from database import get_session, initialize_database
+from database import dispose_engines, get_session, initialize_database
 from dokku import dokku_client, dokku_commands
 from exceptions import (
     dokku_command_exception_handler,
     dokku_parse_exception_handler,
     dokku_plugin_not_supported_exception_handler,
+    dokku_unavailable_exception_handler,
     DokkuCommandError,
     DokkuParseError,
     DokkuPluginNotSupportedError,
+    DokkuUnavailableError,
     generic_exception_handler,
 )
-from fastapi import BackgroundTasks, Depends, FastAPI, HTTPException
+from fastapi import Depends, FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from models import DokkuCommandRequest
-from routers import apps, github, logs
-from sqlmodel import Session
-from utils import db_utils
+from fastapi.responses import JSONResponse, PlainTextResponse
+from models import DokkuBatchRequest, DokkuCommandRequest
+from routers import apps, debug, github, jobs, logs
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import batch_utils, disconnect_utils, github_utils, health_utils, job_utils, metrics_utils, profile_utils, snapshot_utils, stream_utils, timing_utils
 
 # ======================================================= Logging setup
 logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO"), format="%(levelname)-9s [%(name)-8s] %(message)s")
@@ -32,23 +35,31 @@ async def lifespan(app: FastAPI):
     Lifecylce events for the FastAPI application.
     Lines before 'yield' are executed at startup, lines after during shutdown
     """
-    startup()
+    await startup()
     yield
-    shutdown()
+    await shutdown()
 
 
-def startup():
+async def startup():
     """
     Startup tasks
     """
     initialize_database()
+    await job_utils.worker.start()
+    await health_utils.prober.start()
+    await snapshot_utils.refresher.start()
 
 
-def shutdown():
+async def shutdown():
     """
     Shutdown tasks
     """
-    return
+    await snapshot_utils.refresher.stop()
+    await health_utils.prober.stop()
+    await job_utils.worker.stop()
+    await dokku_client.close_pool()
+    await github_utils.close_http_client()
+    await dispose_engines()
 
 
 # ======================================================= Root FastAPI application
@@ -61,18 +72,29 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
     allow_credentials=True,
+    expose_headers=[snapshot_utils.STALE_AFTER_HEADER],
 )
 
+# ======================================================= Request timing
+app.add_middleware(profile_utils.SlowRequestProfilerMiddleware)
+app.add_middleware(timing_utils.ServerTimingMiddleware)
+
+# ======================================================= Client disconnects
+app.add_middleware(disconnect_utils.CancelOnDisconnectMiddleware)
+
 # ======================================================= Routers
 app.include_router(apps.router, prefix="/apps")
 app.include_router(github.router, prefix="/github")
+app.include_router(jobs.router, prefix="/jobs")
 app.include_router(logs.router, prefix="/logs")
+app.include_router(debug.router, prefix="/debug")
 
 # ======================================================= Exception handlers
 app.add_exception_handler(Exception, generic_exception_handler)
 app.add_exception_handler(DokkuCommandError, dokku_command_exception_handler)
 app.add_exception_handler(DokkuParseError, dokku_parse_exception_handler)
 app.add_exception_handler(DokkuPluginNotSupportedError, dokku_plugin_not_supported_exception_handler)
+app.add_exception_handler(DokkuUnavailableError, dokku_unavailable_exception_handler)
 
 
 # ======================================================= Routes
@@ -86,36 +108,121 @@ async def root():
 
 
 @app.get("/health")
-async def health_check(db: Session = Depends(get_session)):
+async def health_check():
     """
-    Health check endpoint
+    Health check endpoint, answered from the background health probe's last result.
     """
-    try:
-        db_utils.health_check(db)  # check db connection
-        await dokku_commands.list_apps()  # check dokku connection
-
-        return {"status": "healthy", "database": "connected", "dokku": "connected", "version": "0.0.7"}  # manually incrementing this for now, hacky
-    except Exception as e:
-        logger.error(f"Database health check failed: {str(e)}")
+    result = await health_utils.prober.get_result()
+    if result["checks"]["database"]["status"] != "connected":
         raise HTTPException(status_code=503, detail="Database connection failed")
+    if result["checks"]["dokku"]["status"] != "connected":
+        raise HTTPException(status_code=503, detail="Dokku daemon connection failed")
+
+    return {"status": "healthy", "database": "connected", "dokku": "connected", "version": "0.0.7"}  # manually incrementing this for now, hacky
+
+
+@app.get("/health/live")
+async def liveness_check():
+    """
+    Liveness check, only confirms the process is serving requests.
+    """
+    return {"status": "alive"}
+
+
+@app.get("/health/ready")
+async def readiness_check():
+    """
+    Readiness check, reports the last health probe with per-check latency. Returns 503 if it failed or is stale.
+    """
+    result = await health_utils.prober.get_result()
+    ready = health_utils.prober.is_ready()
+    content = {**result, "ready": ready, "circuit_breaker": dokku_client.breaker.stats()}
+    return JSONResponse(status_code=200 if ready else 503, content=content)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Expose dokku daemon and GitHub API metrics in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics_utils.render_metrics(), media_type="text/plain; version=0.0.4")
 
 
 @app.post("/update")
-async def update(background_tasks: BackgroundTasks):
+async def update(db: AsyncSession = Depends(get_session)):
     """
     Update Dokku API to latest version.
     """
-    # run as background task as this can take a while
-    background_tasks.add_task(dokku_commands.sync_app_from_git_url, app_name="dokku-api", git_url="https://github.com/indiehost/dokku-dashboard.git")
-    return {"status": "started"}
+    # run as a job as this can take a while
+    job = await job_utils.enqueue_job(db, "sync", app_name="dokku-api", git_url="https://github.com/indiehost/dokku-dashboard.git")
+    return {"status": "started", "job_id": job.id}
+
+
+@app.post("/update/stream")
+async def stream_update():
+    """
+    Update Dokku API to latest version, streaming progress to the client as server-sent events.
+
+    Holds the app's job slot like the queued update, so two updates never run at once.
+    """
+    return stream_utils.sse_response(
+        job_utils.stream_holding_app(
+            "dokku-api",
+            dokku_commands.stream_sync_app_from_git_url(app_name="dokku-api", git_url="https://github.com/indiehost/dokku-dashboard.git"),
+        )
+    )
 
 
 @app.post("/dokku/command")
-async def execute_command(request: DokkuCommandRequest):
+async def execute_command(request: DokkuCommandRequest, http_request: Request):
     """
     Execute a dokku command.
     """
-    response = await dokku_client.execute(request.command)
+    # reads are abandoned if the client goes away, anything else runs to completion
+    read = dokku_commands.command_class(request.command) == "read"
+    disconnect_utils.set_cancel_on_disconnect(http_request, read)
+    response = await dokku_client.execute(request.command, timeout=dokku_commands.command_timeout(request.command), idempotent=read)
+    dokku_commands.invalidate_cache_for_command(request.command)
     if not response.success:
         raise HTTPException(status_code=500, detail=response.error)
     return response.data
+
+
+@app.post("/dokku/batch")
+async def execute_batch(request: DokkuBatchRequest):
+    """
+    Execute a batch of dokku commands in one request, sequentially or in parallel.
+
+    Returns each command's result and timing with a summary, or streams them as NDJSON as they complete,
+    followed by a summary line. A failed command doesn't fail the batch.
+    """
+    if not request.commands:
+        raise HTTPException(status_code=400, detail="No commands given")
+    if len(request.commands) > batch_utils.BATCH_MAX_COMMANDS:
+        raise HTTPException(status_code=400, detail=f"Batches are limited to {batch_utils.BATCH_MAX_COMMANDS} commands")
+
+    concurrency = max(1, min(request.concurrency, batch_utils.BATCH_MAX_CONCURRENCY))
+    results = batch_utils.run_batch(request.commands, request.mode == "parallel", concurrency, request.stop_on_error)
+    if request.stream:
+        return stream_utils.ndjson_response(batch_utils.with_summary(results))
+
+    collected = [result async for result in batch_utils.with_summary(results)]
+    summary = collected.pop()["summary"]
+    return {"results": sorted(collected, key=lambda result: result["index"]), **summary}
+
+
+@app.get("/dokku/cache")
+async def get_cache_stats():
+    """
+    Get read cache hit/miss counters and TTLs.
+    """
+    return dokku_commands.get_cache_stats()
+
+
+@app.delete("/dokku/cache")
+async def clear_cache():
+    """
+    Drop every cached dokku read.
+    """
+    dokku_commands.clear_cache()
+    return {"cleared": True}
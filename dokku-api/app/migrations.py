@@ -0,0 +1,90 @@
+import logging
+from datetime import datetime
+
+from sqlalchemy import Connection, Engine, text
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+
+# ======================================================= Migrations
+# (table, column) pairs rows are looked up by, each unique per row
+UNIQUE_INDEXES = [("deployment_configs", "dokku_app_name"), ("github_app_credentials", "app_id")]
+
+
+def _add_unique_indexes(connection: Connection):
+    """
+    Add the unique lookup indexes, skipping any table that holds duplicate rows.
+
+    Duplicates are never deleted here: which row is the live one is for an operator to decide. They are logged
+    with their ids instead, and the index is added on the first startup after they have been resolved.
+    Index names match the ones SQLModel creates for fresh databases from the model definitions.
+    """
+    for table, column in UNIQUE_INDEXES:
+        duplicates = connection.execute(
+            text(f"SELECT {column}, GROUP_CONCAT(id) FROM {table} GROUP BY {column} HAVING COUNT(*) > 1")
+        ).all()
+        if duplicates:
+            for value, ids in duplicates:
+                logger.error(f"Duplicate rows in {table} for {column}={value!r} (ids {ids}), not adding unique index ix_{table}_{column}")
+            continue
+
+        connection.execute(text(f"CREATE UNIQUE INDEX IF NOT EXISTS ix_{table}_{column} ON {table} ({column})"))
+
+
+def _add_lookup_indexes(connection: Connection):
+    """
+    Add indexes on the columns the API looks rows up by. The unique ones are added by _add_unique_indexes,
+    which runs on every startup.
+    """
+    connection.execute(
+        text("CREATE INDEX IF NOT EXISTS ix_deployment_configs_repo_branch ON deployment_configs (github_repo_id, branch_to_deploy)")
+    )
+
+
+def _backfill_branch_to_deploy(connection: Connection):
+    """
+    Track the repository's default branch in configs created before branch_to_deploy was set from it.
+
+    Those configs were all left on the "main" default while dokku was set to deploy the default branch, so
+    pushes to repositories with any other default branch never matched them for auto deploys.
+    """
+    result = connection.execute(
+        text("UPDATE deployment_configs SET branch_to_deploy = github_default_branch WHERE branch_to_deploy = 'main' AND github_default_branch != 'main'")
+    )
+    if result.rowcount:
+        logger.info(f"Set branch_to_deploy to the repository's default branch in {result.rowcount} deployment configs")
+
+
+# Ordered list of (version, description, migration function). Only ever append to this list.
+MIGRATIONS = [
+    (1, "Add lookup indexes on deployment configs and GitHub app credentials", _add_lookup_indexes),
+    (2, "Set branch_to_deploy to the repository's default branch", _backfill_branch_to_deploy),
+]
+
+
+def run_migrations(engine: Engine):
+    """
+    Apply every migration newer than the database's schema version, each in its own transaction.
+    """
+    with engine.begin() as connection:
+        connection.execute(
+            text("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, description TEXT NOT NULL, applied_at TIMESTAMP NOT NULL)")
+        )
+        current_version = connection.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")).scalar()
+
+    for version, description, migration in MIGRATIONS:
+        if version <= current_version:
+            continue
+
+        logger.info(f"Applying database migration {version}: {description}")
+        with engine.begin() as connection:
+            migration(connection)
+            connection.execute(
+                text("INSERT INTO schema_migrations (version, description, applied_at) VALUES (:version, :description, :applied_at)"),
+                {"version": version, "description": description, "applied_at": datetime.utcnow()},
+            )
+
+    # checked on every startup, so unique indexes skipped over duplicate rows are added once they are resolved
+    with engine.begin() as connection:
+        _add_unique_indexes(connection)
@@ -1,7 +1,9 @@
 from datetime import datetime
-from typing import Any, Optional
+from typing import Any, List, Literal, Optional
 
+from database import generate_id
 from pydantic import BaseModel
+from sqlalchemy import Column, Index, JSON
 from sqlmodel import Field, SQLModel
 
 
@@ -10,7 +12,7 @@ class GitHubAppCredentials(SQLModel, table=True):
     __tablename__ = "github_app_credentials"
 
     id: Optional[int] = Field(default=None, primary_key=True)
-    app_id: str
+    app_id: str = Field(unique=True, index=True)
     app_name: str
     client_id: str
     client_secret_encrypted: str
@@ -21,9 +23,23 @@ class GitHubAppCredentials(SQLModel, table=True):
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
 
+class GitHubResponseCache(SQLModel, table=True):
+    __tablename__ = "github_response_cache"
+
+    # request URL, prefixed with the app/installation it was fetched as since listings differ per installation
+    cache_key: str = Field(primary_key=True)
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+    body: Any = Field(default=None, sa_column=Column(JSON))
+    next_url: Optional[str] = None  # pagination link of the cached page
+
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+
+
 # ======================================================= Deployments
 class DeploymentConfig(SQLModel, table=True):
     __tablename__ = "deployment_configs"
+    __table_args__ = (Index("ix_deployment_configs_repo_branch", "github_repo_id", "branch_to_deploy"),)  # webhook routing
 
     id: Optional[int] = Field(default=None, primary_key=True)
 
@@ -36,7 +52,7 @@ class DeploymentConfig(SQLModel, table=True):
     github_default_branch: str
 
     # Dokku app details
-    dokku_app_name: str
+    dokku_app_name: str = Field(unique=True, index=True)
 
     # Optional deployment configuration
     build_directory: Optional[str] = None
@@ -56,19 +72,82 @@ class DeploymentConfigCreate(BaseModel):
     github_app_id: str
     github_app_installation_id: str
     build_directory: Optional[str] = None
+    branch_to_deploy: Optional[str] = None  # defaults to the repository's default branch
+
+
+# ======================================================= Jobs
+class Job(SQLModel, table=True):
+    __tablename__ = "jobs"
+
+    id: str = Field(default_factory=lambda: generate_id("job"), primary_key=True)
+
+    kind: str  # e.g. "rebuild", "sync", "deploy"
+    app_name: str = Field(index=True)
+    args: dict = Field(default_factory=dict, sa_column=Column(JSON))
+
+    status: str = Field(default="queued", index=True)  # queued, running, succeeded, failed, cancelled
+    output: Optional[str] = None
+    error: Optional[str] = None
+
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
 
 
 # ======================================================= Dokku
+class AppSnapshot(SQLModel, table=True):
+    __tablename__ = "app_snapshots"
+
+    # last known reports of an app, kept current in the background so reads don't wait on the daemon
+    app_name: str = Field(primary_key=True)
+    app_report: Any = Field(default=None, sa_column=Column(JSON))
+    ps_report: Any = Field(default=None, sa_column=Column(JSON))
+    domains_report: Any = Field(default=None, sa_column=Column(JSON))
+
+    refreshed_at: datetime = Field(default_factory=datetime.utcnow)
+    stale_after: datetime = Field(default_factory=datetime.utcnow)
+
+
 class DokkuCommandRequest(BaseModel):
     command: str
 
 
+class DokkuBatchRequest(BaseModel):
+    commands: List[str]
+    mode: Literal["sequential", "parallel"] = "sequential"
+    concurrency: int = 4  # parallel only, capped at DOKKU_BATCH_MAX_CONCURRENCY
+    stop_on_error: bool = False  # sequential only, skip the commands after the first failure
+    stream: bool = False  # stream results as NDJSON as they complete instead of returning them all at once
+
+
+class DokkuBulkActionRequest(BaseModel):
+    apps: Optional[List[str]] = None
+    pattern: Optional[str] = None  # glob matched against app names instead of listing them, e.g. "staging-*"
+    parallelism: int = 2  # capped at BULK_MAX_PARALLELISM
+    mode: Literal["parallel", "rolling"] = "parallel"
+    max_failure_rate: float = 0.5  # stop starting apps once a larger share of the finished ones failed
+
+
 class DokkuResponse(BaseModel):
     success: bool
     data: Optional[Any] = None
     error: Optional[str] = None
 
 
+class DokkuPlugin(BaseModel):
+    name: str
+    version: str
+    enabled: bool
+    description: str = ""
+
+
+class DokkuProcess(BaseModel):
+    process_type: str  # e.g. "web", "worker"
+    index: int
+    status: str  # e.g. "running", "exited"
+    container_id: Optional[str] = None
+
+
 class DokkuAppCreate(BaseModel):
     name: str
 
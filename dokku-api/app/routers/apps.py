@@ -1,11 +1,12 @@
 import logging
+from typing import Literal
 
 from database import get_session
-from dokku import dokku_commands
-from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
-from models import DeploymentConfig, DeploymentConfigCreate, DokkuAppCreate
-from sqlmodel import Session
-from utils import db_utils, github_utils
+from dokku import dokku_commands, dokku_logs
+from fastapi import APIRouter, Depends, HTTPException, Response
+from models import DeploymentConfig, DeploymentConfigCreate, DokkuAppCreate, DokkuBulkActionRequest
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import bulk_utils, db_utils, github_utils, job_utils, snapshot_utils, stream_utils
 
 # ======================================================= Config
 router = APIRouter()
@@ -14,19 +15,54 @@ logger = logging.getLogger(__name__)
 
 # ======================================================= Routes
 @router.get("")
-async def list_apps():
+async def list_apps(response: Response, fresh: bool = False):
     """
-    List all dokku apps.
+    List all dokku apps, from the fleet snapshot unless fresh is set.
     """
-    return await dokku_commands.list_apps()
+    return await snapshot_utils.read_app_names(response, fresh)
+
+
+@router.get("/reports")
+async def get_app_reports(kind: Literal["app", "ps", "domains"] = "app"):
+    """
+    Get a report for every Dokku app in a single daemon call, keyed by app name.
+    """
+    if kind == "ps":
+        return await dokku_commands.get_all_process_reports()
+    if kind == "domains":
+        return await dokku_commands.get_all_domains_reports()
+    return await dokku_commands.get_all_app_reports()
+
+
+@router.post("/bulk/{action}")
+async def bulk_app_action(action: Literal["restart", "stop", "start", "rebuild"], request: DokkuBulkActionRequest):
+    """
+    Restart, stop, start or rebuild many apps, selected by name or glob pattern, streaming progress as server-sent events.
+
+    Apps run in parallel up to the requested parallelism, or in rolling windows of that size, and no more are
+    started once the failure rate passes max_failure_rate.
+    """
+    if (request.apps is None) == (request.pattern is None):
+        raise HTTPException(status_code=400, detail="Give either a list of apps or a pattern")
+
+    app_names, unknown = bulk_utils.select_apps(await dokku_commands.list_apps(), request.apps, request.pattern)
+    if unknown:
+        raise HTTPException(status_code=404, detail=f"Apps not found: {', '.join(unknown)}")
+    if not app_names:
+        raise HTTPException(status_code=404, detail="No apps matched")
+
+    parallelism = max(1, min(request.parallelism, bulk_utils.BULK_MAX_PARALLELISM))
+    return stream_utils.sse_response(
+        bulk_utils.run_bulk_action(action, app_names, parallelism, request.mode == "rolling", request.max_failure_rate)
+    )
 
 
 @router.get("/{app_name}")
-async def get_app(app_name: str):
+async def get_app(app_name: str, response: Response, fresh: bool = False):
     """
-    Get a Dokku app report.
+    Get a Dokku app report, from the fleet snapshot unless fresh is set.
     """
-    return await dokku_commands.get_app_report(app_name)
+    return await snapshot_utils.read_report(app_name, "app_report", response, fresh)
 
 
 @router.post("")
@@ -46,13 +82,23 @@ async def restart_app(app_name: str):
 
 
 @router.post("/{app_name}/rebuild")
-async def rebuild_app(app_name: str, background_tasks: BackgroundTasks):
+async def rebuild_app(app_name: str, db: AsyncSession = Depends(get_session)):
     """
     Rebuild a Dokku app.
     """
-    # run as background task as this can take a while
-    background_tasks.add_task(dokku_commands.rebuild_app, app_name)
-    return {"started": True}
+    # run as a job as this can take a while
+    job = await job_utils.enqueue_job(db, "rebuild", app_name)
+    return {"started": True, "job_id": job.id}
+
+
+@router.post("/{app_name}/rebuild/stream")
+async def stream_rebuild_app(app_name: str):
+    """
+    Rebuild a Dokku app, streaming progress to the client as server-sent events.
+
+    Holds the app's job slot, so it waits for running jobs such as a deploy of the app and counts towards JOB_CONCURRENCY.
+    """
+    return stream_utils.sse_response(job_utils.stream_holding_app(app_name, dokku_commands.stream_rebuild_app(app_name)))
 
 
 @router.post("/{app_name}/start")
@@ -80,11 +126,11 @@ async def delete_app(app_name: str):
 
 
 @router.get("/{app_name}/domains")
-async def get_app_domains_report(app_name: str):
+async def get_app_domains_report(app_name: str, response: Response, fresh: bool = False):
     """
-    List all domains for a given app.
+    List all domains for a given app, from the fleet snapshot unless fresh is set.
     """
-    return await dokku_commands.app_domains_report(app_name)
+    return await snapshot_utils.read_report(app_name, "domains_report", response, fresh)
 
 
 @router.get("/{app_name}/logs")
@@ -95,29 +141,35 @@ async def get_app_logs(app_name: str):
     return await dokku_commands.get_app_logs(app_name)
 
 
+@router.get("/{app_name}/logs/stream")
+async def stream_app_logs(app_name: str):
+    """
+    Live tail a Dokku app's logs as server-sent events.
+    """
+    return stream_utils.sse_response(dokku_logs.stream_app_logs(app_name))
+
+
 @router.get("/{app_name}/status")
-async def get_app_process_report(app_name: str):
+async def get_app_process_report(app_name: str, response: Response, fresh: bool = False):
     """
-    Get process report for a Dokku app.
+    Get process report for a Dokku app, from the fleet snapshot unless fresh is set.
     """
-    return await dokku_commands.get_app_process_report(app_name)
+    return await snapshot_utils.read_report(app_name, "ps_report", response, fresh)
 
 
 # ======================================================= Deployment Config
 @router.get("/{app_name}/deployment-config", response_model=DeploymentConfig)
-async def get_app_deployment_config(app_name: str, db: Session = Depends(get_session)):
+async def get_app_deployment_config(app_name: str, db: AsyncSession = Depends(get_session)):
     """
     Get a Dokku app's deployment config.
 
     Temporary for testing git repo deployments, will change
     """
-    return db_utils.get_deployment_config_by_app_name(db, app_name)
+    return await db_utils.get_deployment_config_by_app_name(db, app_name)
 
 
 @router.post("/{app_name}/deployment-config")
-async def create_deployment_config(
-    deployment_config: DeploymentConfigCreate, db: Session = Depends(get_session), background_tasks: BackgroundTasks = BackgroundTasks()
-):
+async def create_deployment_config(deployment_config: DeploymentConfigCreate, db: AsyncSession = Depends(get_session)):
     """
     Create a deployment config for a Dokku app.
 
@@ -126,53 +178,33 @@ async def create_deployment_config(
     logger.info(f"Creating deployment config for app: {deployment_config.dokku_app_name}")
 
     # check if app already has a deployment config
-    existing_deployment_config = db_utils.get_deployment_config_by_app_name(db, deployment_config.dokku_app_name)
+    existing_deployment_config = await db_utils.get_deployment_config_by_app_name(db, deployment_config.dokku_app_name)
     if existing_deployment_config:
         raise HTTPException(status_code=400, detail=f"Deployment config already exists for app: {deployment_config.dokku_app_name}")
 
     # save deployment config in db
-    db_deployment_config = db_utils.create_deployment_config(db, deployment_config)
+    db_deployment_config = await db_utils.create_deployment_config(db, deployment_config)
     logger.info(f"Saved deployment config to database for app: {deployment_config.dokku_app_name}")
 
     # get app credentials
-    github_app_credentials = db_utils.get_github_app_credentials_by_app_id(db, deployment_config.github_app_id)
+    github_app_credentials = await github_utils.get_app_credentials(db, deployment_config.github_app_id)
     if not github_app_credentials:
         raise HTTPException(status_code=404, detail=f"GitHub app credentials not found for app ID: {deployment_config.github_app_id}")
 
     logger.info(f"Retrieved GitHub app credentials for app ID: {deployment_config.github_app_id}")
 
-    # get repo credentials
-    client = github_utils.GitHubAppClient(github_app_credentials)
-    access_token = client.get_installation_access_token(deployment_config.github_app_installation_id)
-    logger.info(f"Retrieved installation access token for installation ID: {deployment_config.github_app_installation_id}")
-
     # set build directory if provided
     if deployment_config.build_directory:
         logger.info(f"Setting build directory to: {deployment_config.build_directory}")
         await dokku_commands.set_app_build_dir(deployment_config.dokku_app_name, deployment_config.build_directory)
 
-    # set git branch to deploy
-    logger.info(f"Setting git branch to deploy to: {deployment_config.github_default_branch}")
-    await dokku_commands.set_app_git_branch(deployment_config.dokku_app_name, deployment_config.github_default_branch)
+    # set git branch to deploy, the same branch pushes are matched against for auto deploys
+    logger.info(f"Setting git branch to deploy to: {db_deployment_config.branch_to_deploy}")
+    await dokku_commands.set_app_git_branch(deployment_config.dokku_app_name, db_deployment_config.branch_to_deploy)
 
-    # Build GitHub URL with access token
-    git_url_with_access_token = github_utils.build_github_url_with_access_token(deployment_config.github_repo_url, access_token)
-    logger.info(f"Starting deployment from repository: {deployment_config.github_repo_url}")
-
-    # trigger deployment as background task as it can take a while
-    background_tasks.add_task(deploy_app_from_git_url, app_name=deployment_config.dokku_app_name, git_url_with_access_token=git_url_with_access_token)
+    # trigger deployment as a job as it can take a while, the job mints the repo access token when it runs.
+    # Only this first deploy enables Let's Encrypt, push deploys leave the certificate to dokku's renewals.
+    await job_utils.enqueue_job(db, "deploy", deployment_config.dokku_app_name, lets_encrypt=True)
+    logger.info(f"Queued deployment from repository: {deployment_config.github_repo_url}")
 
     return db_deployment_config
-
-
-# ======================================================= Helpers
-async def deploy_app_from_git_url(app_name: str, git_url_with_access_token: str):
-    """
-    Deploy a Dokku app from a git URL.
-
-    Ran as background task for now while testing
-
-    NOTE: Temporary while testing, this + adding deployment config will be refactored
-    """
-    await dokku_commands.sync_app_from_git_url(app_name, git_url_with_access_token)
-    await dokku_commands.enable_lets_encrypt(app_name)
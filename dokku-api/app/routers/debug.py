@@ -0,0 +1,41 @@
+import logging
+
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import FileResponse, PlainTextResponse
+from utils import profile_utils
+
+# ======================================================= Config
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+# ======================================================= Routes
+@router.get("/profiles")
+async def list_profiles():
+    """
+    List the cProfile captures of slow requests, newest first. Captures are only taken when SLOW_REQUEST_PROFILE_MS is set.
+    """
+    return {
+        "enabled": bool(profile_utils.SLOW_REQUEST_PROFILE_MS),
+        "threshold_ms": profile_utils.SLOW_REQUEST_PROFILE_MS,
+        "profiles": profile_utils.list_profiles(),
+    }
+
+
+@router.get("/profiles/{name}")
+async def get_profile(name: str, sort: str = "cumulative", limit: int = 50, raw: bool = False):
+    """
+    Get a capture as a pstats text report, or the raw .prof file for snakeviz and friends with ?raw=true.
+    """
+    if sort not in profile_utils.PROFILE_SORT_KEYS:
+        raise HTTPException(status_code=400, detail=f"Unknown sort key: {sort}, use one of: {', '.join(profile_utils.PROFILE_SORT_KEYS)}")
+    if not 1 <= limit <= profile_utils.PROFILE_MAX_LIMIT:
+        raise HTTPException(status_code=400, detail=f"Limit must be between 1 and {profile_utils.PROFILE_MAX_LIMIT}")
+
+    path = profile_utils.get_profile_path(name)
+    if path is None:
+        raise HTTPException(status_code=404, detail=f"Profile not found: {name}")
+
+    if raw:
+        return FileResponse(path, media_type="application/octet-stream", filename=name)
+    return PlainTextResponse(profile_utils.format_profile(path, sort=sort, limit=limit))
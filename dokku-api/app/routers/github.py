@@ -1,14 +1,15 @@
+import asyncio
 import logging
 import os
 import secrets
+from typing import Optional
 
-import requests
 from database import get_session
 from dotenv import load_dotenv
-from fastapi import APIRouter, Depends, Request, Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, Response
 from fastapi.responses import JSONResponse, RedirectResponse
-from sqlmodel import Session
-from utils import db_utils, github_utils
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import db_utils, disconnect_utils, github_utils, webhook_utils
 
 # ======================================================= Config
 router = APIRouter()
@@ -23,54 +24,46 @@ GITHUB_APP_CALLBACK_URL = f"{DOKKU_API_URL}/github/apps/create/callback"
 
 # ======================================================= GitHub app
 @router.get("/installations")
-async def list_installations(db: Session = Depends(get_session)):
+async def list_installations(db: AsyncSession = Depends(get_session)):
     """
     List all installations and repositories for the GitHub App, organized by app and installation.
     Returns a structured list of apps, their installations, and available repositories.
     """
-    # TODO: Break into smaller chunks, no need to get all this data at once
-    apps_list = []
-    credentials = db_utils.get_all_github_app_credentials(db)
-
-    for credential in credentials:
-        logger.info(f"Getting installations for GitHub App ID: {credential.app_id}")
-        app_data = {"app_id": credential.app_id, "app_name": credential.app_name, "installations": []}
-
-        client = github_utils.GitHubAppClient(credential)
+    # NOTE: Prefer the per-app and per-installation routes below to load repositories lazily
+    credentials = await db_utils.get_all_github_app_credentials(db)
 
+    async def get_app_data(credential):
         logger.info(f"Getting installations for GitHub App with ID: {credential.app_id}")
-        installations = client.get_installations()
+        client = github_utils.GitHubAppClient(credential)
+        installations = await github_utils.get_installations_with_repositories(client)
 
-        for installation in installations:
-            installation_data = {
-                "id": installation.raw_data["id"],
-                "account_name": installation.raw_data["account"]["login"],
-                "account_type": installation.raw_data["account"]["type"],  # Will be either "User" or "Organization"
-                "account_avatar": installation.raw_data["account"]["avatar_url"],
-                "repositories": [],
-            }
+        return {
+            "app_id": credential.app_id,
+            "app_name": credential.app_name,
+            "installations": [_installation_data(installation, repos) for installation, repos in installations],
+        }
 
-            # Get repositories for each installation
-            repos = installation.get_repos()
-            for repo in repos:
-                repo_data = {
-                    "id": repo.id,
-                    "name": repo.name,
-                    "full_name": repo.full_name,
-                    "private": repo.private,
-                    "html_url": repo.html_url,
-                    "git_url": repo.clone_url,
-                    "default_branch": repo.default_branch,
-                }
-                installation_data["repositories"].append(repo_data)
+    return await asyncio.gather(*[get_app_data(credential) for credential in credentials])
 
-                # TODO: will need to list other branches here so user can optionally select one to deploy
 
-            app_data["installations"].append(installation_data)
+@router.get("/apps/{app_id}/installations")
+async def list_app_installations(app_id: str, db: AsyncSession = Depends(get_session)):
+    """
+    List the installations of a GitHub App, without their repositories.
+    """
+    client = github_utils.GitHubAppClient(await _get_credentials(db, app_id))
+    installations = await client.get_installations()
+    return [_installation_data(installation, repos=None) for installation in installations]
 
-        apps_list.append(app_data)
 
-    return apps_list
+@router.get("/apps/{app_id}/installations/{installation_id}/repositories")
+async def list_installation_repositories(app_id: str, installation_id: str, db: AsyncSession = Depends(get_session)):
+    """
+    List the repositories a GitHub App installation can access.
+    """
+    client = github_utils.GitHubAppClient(await _get_credentials(db, app_id))
+    repos = await client.get_installation_repositories(installation_id)
+    return [_repository_data(repo) for repo in repos]
 
 
 @router.post("/apps/create")
@@ -92,24 +85,20 @@ async def create_github_app():
     return RedirectResponse(github_url)
 
 
-@router.get("/apps/create/callback")
-def handle_create_callback(code: str, db: Session = Depends(get_session)):
+@router.get("/apps/create/callback", dependencies=[Depends(disconnect_utils.keep_running_on_disconnect)])
+async def handle_create_callback(code: str, db: AsyncSession = Depends(get_session)):
     """
     Handle the callback from GitHub's App manifest flow
     """
     logger.info(f"Received GitHub App manifest callback with code: {code}")
 
     # Exchange the temporary code for the app's credentials
-    response = requests.post(f"https://api.github.com/app-manifests/{code}/conversions", headers={"Accept": "application/vnd.github.v3+json"})
-
-    # Check if the response is successful
-    if response.status_code != 201:
-        logger.error(f"Failed to create GitHub App. Status code: {response.status_code}, Response: {response.text}")
+    app_data = await github_utils.convert_app_manifest(code)
+    if app_data is None:
         return JSONResponse(status_code=400, content={"error": "Failed to create GitHub App"})
 
     # Save app credentials in the database
-    app_data = response.json()
-    github_utils.save_github_app_credentials(db, app_data)
+    await github_utils.save_github_app_credentials(db, app_data)
 
     logger.info(f"Successfully created GitHub App with ID: {app_data['id']}")
 
@@ -121,29 +110,77 @@ def handle_create_callback(code: str, db: Session = Depends(get_session)):
 
 # ======================================================= Webhook
 @router.post("/webhook")
-async def handle_github_webhook(request: Request, db: Session = Depends(get_session)):
+async def handle_github_webhook(request: Request, background_tasks: BackgroundTasks, db: AsyncSession = Depends(get_session)):
     """
     Handle incoming webhooks from GitHub
+
+    Deliveries are verified and acknowledged with a 202 straight away, the event itself is processed in the background
+    so GitHub's 10 second delivery timeout is never at risk. Redelivered events are acknowledged but not processed again.
     """
     # Get event type and payload
     event_type = request.headers.get("X-GitHub-Event")
     app_id = request.headers.get("X-GitHub-Hook-Installation-Target-ID")
+    delivery_id = request.headers.get("X-GitHub-Delivery")
 
-    logger.info(f"Received GitHub webhook with event type: {event_type}, app ID: {app_id}")
+    logger.info(f"Received GitHub webhook with event type: {event_type}, app ID: {app_id}, delivery: {delivery_id}")
 
-    # Get corresponding GitHub App credentials from db
-    credentials = db_utils.get_github_app_credentials_by_app_id(db, app_id)
+    # Get corresponding GitHub App credentials, cached in memory after the first webhook
+    credentials = await _get_credentials(db, app_id)
 
     # Verify the webhook signature
     await github_utils.verify_signature(request, credentials)
     logger.info(f"Webhook signature verified for app ID: {app_id}")
 
-    # Read the payload
+    # Skip deliveries GitHub is retrying, only once verified so forged requests can't mark ids as seen
+    if delivery_id and webhook_utils.delivery_log.seen(delivery_id):
+        logger.info(f"Ignoring already processed webhook delivery: {delivery_id}")
+        return Response(status_code=202)
+
+    # Read the payload and handle the event once the response has been sent
     payload = await request.json()
+    background_tasks.add_task(webhook_utils.process_event, event_type, payload)
+
+    # accepted
+    return Response(status_code=202)
+
+
+# ======================================================= Helpers
+async def _get_credentials(db: AsyncSession, app_id: str):
+    """
+    Get a GitHub App's credentials or raise a 404.
+    """
+    credentials = await github_utils.get_app_credentials(db, app_id)
+    if not credentials:
+        raise HTTPException(status_code=404, detail=f"GitHub app credentials not found for app ID: {app_id}")
+    return credentials
 
-    # Handle the events
-    if event_type == "push":
-        return await github_utils.handle_push_event(payload, credentials)
 
-    # success
-    return Response(status_code=200)
+def _installation_data(installation: dict, repos: Optional[list]) -> dict:
+    """
+    Shape a GitHub installation and, if given, its repositories for the UI.
+    """
+    installation_data = {
+        "id": installation["id"],
+        "account_name": installation["account"]["login"],
+        "account_type": installation["account"]["type"],  # Will be either "User" or "Organization"
+        "account_avatar": installation["account"]["avatar_url"],
+    }
+    if repos is not None:
+        installation_data["repositories"] = [_repository_data(repo) for repo in repos]
+    return installation_data
+
+
+def _repository_data(repo: dict) -> dict:
+    """
+    Shape a GitHub repository for the UI.
+    """
+    # TODO: will need to list other branches here so user can optionally select one to deploy
+    return {
+        "id": repo["id"],
+        "name": repo["name"],
+        "full_name": repo["full_name"],
+        "private": repo["private"],
+        "html_url": repo["html_url"],
+        "git_url": repo["clone_url"],
+        "default_branch": repo["default_branch"],
+    }
@@ -0,0 +1,46 @@
+import logging
+
+from database import get_session
+from fastapi import APIRouter, Depends, HTTPException
+from models import Job
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import db_utils, job_utils
+
+# ======================================================= Config
+router = APIRouter()
+logger = logging.getLogger(__name__)
+
+
+# ======================================================= Routes
+@router.get("", response_model=list[Job])
+async def list_jobs(status: str = None, app_name: str = None, limit: int = 100, db: AsyncSession = Depends(get_session)):
+    """
+    List jobs, newest first.
+    """
+    return await db_utils.list_jobs(db, status=status, app_name=app_name, limit=limit)
+
+
+@router.get("/{job_id}", response_model=Job)
+async def get_job(job_id: str, db: AsyncSession = Depends(get_session)):
+    """
+    Get a job and its status.
+    """
+    job = await db_utils.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+    return job
+
+
+@router.post("/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str, db: AsyncSession = Depends(get_session)):
+    """
+    Cancel a queued or running job.
+    """
+    job = await db_utils.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail=f"Job not found: {job_id}")
+
+    try:
+        return await job_utils.cancel_job(db, job)
+    except ValueError as e:
+        raise HTTPException(status_code=409, detail=str(e))
@@ -0,0 +1,114 @@
+import asyncio
+import logging
+import os
+import time
+
+from dokku import dokku_client, dokku_commands
+from dotenv import load_dotenv
+from exceptions import DokkuUnavailableError
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BATCH_MAX_COMMANDS = int(os.getenv("DOKKU_BATCH_MAX_COMMANDS", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("DOKKU_BATCH_MAX_CONCURRENCY", "8"))  # the connection pool caps it further at DOKKU_MAX_IN_FLIGHT
+
+
+# ======================================================= Batches
+async def run_batch(commands: list, parallel: bool = False, concurrency: int = 4, stop_on_error: bool = False):
+    """
+    Run a batch of dokku commands, yielding each one's result as it completes.
+
+    Sequential batches run in order and can stop at the first failure, the commands left are reported as skipped.
+    Parallel batches run up to concurrency commands at once and yield in completion order.
+
+    If the client goes away the batch is aborted: commands not started yet never run and running reads are
+    cancelled, but running writes are left to finish, see run_command.
+
+    Yields:
+        dict: Results with the command's index and command, "success", "output", "error" and "duration_ms".
+    """
+    if not parallel:
+        failed = False
+        for index, command in enumerate(commands):
+            if failed and stop_on_error:
+                yield {"index": index, "command": command, "success": False, "output": None, "error": "Skipped after an earlier command failed", "duration_ms": 0.0}
+                continue
+            result = await run_command(index, command)
+            failed = failed or not result["success"]
+            yield result
+        return
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_limited(index: int, command: str) -> dict:
+        async with semaphore:
+            return await run_command(index, command)
+
+    tasks = [asyncio.ensure_future(run_limited(index, command)) for index, command in enumerate(commands)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield await next_result
+    finally:
+        # the client went away or stopped reading, don't start the rest or keep reads running for nobody
+        for task in tasks:
+            task.cancel()
+
+
+async def with_summary(results):
+    """
+    Pass through a batch's results as they complete, then yield a summary of the whole batch.
+    """
+    started_at = time.perf_counter()
+    succeeded = failed = 0
+    async for result in results:
+        if result["success"]:
+            succeeded += 1
+        else:
+            failed += 1
+        yield result
+    yield {"summary": summarize(succeeded, failed, started_at)}
+
+
+def summarize(succeeded: int, failed: int, started_at: float) -> dict:
+    return {"total": succeeded + failed, "succeeded": succeeded, "failed": failed, "duration_ms": round((time.perf_counter() - started_at) * 1000, 2)}
+
+
+async def run_command(index: int, command: str) -> dict:
+    """
+    Run a single command of a batch, reporting failures in the result rather than raising.
+
+    Writes are shielded from cancellation, so a client going away never cuts one off halfway through and the
+    cache is still invalidated once it finishes.
+    """
+    read = dokku_commands.command_class(command) == "read"
+    if read:
+        return await _run_command(index, command, read)
+    return await asyncio.shield(_run_command(index, command, read))
+
+
+async def _run_command(index: int, command: str, read: bool) -> dict:
+    started_at = time.perf_counter()
+    try:
+        response = await dokku_client.execute(
+            command, timeout=dokku_commands.command_timeout(command), count_timeouts=dokku_commands.counts_timeouts(command), idempotent=read
+        )
+        if response.success:
+            success, output, error = response.data.get("ok") is not False, response.data.get("output"), None
+        else:
+            success, output, error = False, None, response.error
+    except DokkuUnavailableError as e:
+        success, output, error = False, None, str(e)
+    finally:
+        dokku_commands.invalidate_cache_for_command(command)
+
+    return {
+        "index": index,
+        "command": command,
+        "success": success,
+        "output": output,
+        "error": error,
+        "duration_ms": round((time.perf_counter() - started_at) * 1000, 2),
+    }
@@ -0,0 +1,162 @@
+import asyncio
+import fnmatch
+import logging
+import os
+import time
+
+from database import create_session
+from dokku import dokku_commands
+from dotenv import load_dotenv
+from exceptions import DokkuError
+from utils import job_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+BULK_MAX_PARALLELISM = int(os.getenv("BULK_MAX_PARALLELISM", "8"))
+BULK_HEARTBEAT_INTERVAL = 5.0  # seconds between heartbeats while apps are running, so proxies don't drop the stream
+
+# Bulk actions and the command each runs for one app, holding the app's job slot so it never overlaps a job
+# (e.g. a deploy) for the same app and counts towards JOB_CONCURRENCY
+BULK_ACTIONS = {
+    "restart": dokku_commands.restart_app,
+    "stop": dokku_commands.stop_app,
+    "start": dokku_commands.start_app,
+}
+
+# Bulk actions queued as jobs instead, so builds share the worker's JOB_CONCURRENCY limit and never overlap
+# another job (e.g. a deploy) for the same app
+BULK_JOB_ACTIONS = {
+    "rebuild": "rebuild",
+}
+
+
+# ======================================================= App selection
+def select_apps(app_names: list, apps: list = None, pattern: str = None) -> tuple:
+    """
+    Select apps by name or by glob pattern (e.g. "staging-*") from the apps on the host.
+
+    Returns the selected app names, in the order given or in host order for a pattern, and any requested names that don't exist.
+    """
+    if pattern is not None:
+        return [name for name in app_names if fnmatch.fnmatchcase(name, pattern)], []
+
+    existing = set(app_names)
+    selected = list(dict.fromkeys(apps or []))
+    return [name for name in selected if name in existing], [name for name in selected if name not in existing]
+
+
+# ======================================================= Runs
+async def run_bulk_action(action: str, app_names: list, parallelism: int = 2, rolling: bool = False, max_failure_rate: float = 0.5):
+    """
+    Run a lifecycle action across apps, yielding progress events as apps start and finish.
+
+    In parallel mode up to parallelism apps run at once, the next one starting as soon as one finishes. In rolling
+    mode apps run in windows of parallelism, each window starting once the previous one has finished.
+
+    Once at least parallelism apps have finished, no more are started if the share that failed exceeds
+    max_failure_rate; apps already running are left to finish and the rest are reported as skipped.
+
+    Rebuilds are queued as jobs, so at most JOB_CONCURRENCY of them run at once whatever the parallelism, and
+    their app_done events carry the job's id and status.
+
+    If the client goes away the run is aborted and no more apps are started, but apps already started are left
+    to finish: restarts, stops and starts are shielded from the cancellation and queued rebuild jobs still run.
+
+    Yields:
+        dict: Events with an "event" key of "started", "app_started", "app_done", "heartbeat", "aborted" or "done".
+    """
+    started_at = time.monotonic()
+    yield {"event": "started", "action": action, "apps": app_names, "parallelism": parallelism, "mode": "rolling" if rolling else "parallel"}
+
+    pending = list(reversed(app_names))
+    running = {}  # task -> app name
+    succeeded = failed = 0
+    aborted = False
+    try:
+        while True:
+            # a rolling window only refills once it is empty
+            if not aborted and not (rolling and running):
+                while pending and len(running) < parallelism:
+                    app_name = pending.pop()
+                    running[asyncio.ensure_future(_run_action(action, app_name))] = app_name
+                    yield {"event": "app_started", "app": app_name}
+
+            if not running:
+                break
+
+            done, _ = await asyncio.wait(set(running), timeout=BULK_HEARTBEAT_INTERVAL, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                yield {"event": "heartbeat", "elapsed": round(time.monotonic() - started_at, 1), "running": list(running.values())}
+                continue
+
+            for task in done:
+                app_name = running.pop(task)
+                result = task.result()
+                if result["success"]:
+                    succeeded += 1
+                else:
+                    failed += 1
+                    logger.warning(f"Bulk {action} failed for {app_name}: {result['error']}")
+                yield {"event": "app_done", "app": app_name, **result}
+
+            finished = succeeded + failed
+            if not aborted and pending and finished >= min(parallelism, len(app_names)) and failed / finished > max_failure_rate:
+                aborted = True
+                logger.error(f"Stopping bulk {action}, {failed} of {finished} apps failed")
+                yield {"event": "aborted", "failed": failed, "finished": finished, "failure_rate": round(failed / finished, 3)}
+    finally:
+        # the client went away, stop waiting on the running apps, whose actions finish on their own
+        for task in running:
+            task.cancel()
+
+    yield {
+        "event": "done",
+        "succeeded": succeeded,
+        "failed": failed,
+        "skipped": len(pending),
+        "aborted": aborted,
+        "elapsed": round(time.monotonic() - started_at, 1),
+    }
+
+
+async def _run_action(action: str, app_name: str) -> dict:
+    """
+    Run the action for one app, reporting a failure in the result rather than raising.
+    """
+    started_at = time.perf_counter()
+    try:
+        if action in BULK_JOB_ACTIONS:
+            job = await _run_job(BULK_JOB_ACTIONS[action], app_name)
+            result = {"success": job.status == "succeeded", "error": job.error, "job_id": job.id, "status": job.status}
+        else:
+            # shielded, so a client going away doesn't cut off a restart halfway through its health checks
+            result = await asyncio.shield(_run_command(action, app_name))
+    except Exception as e:
+        # e.g. the database failing while queuing a job, reported for this app rather than ending the whole run
+        logger.error(f"Bulk {action} failed unexpectedly for {app_name}: {str(e)}")
+        result = {"success": False, "error": f"Unexpected error: {str(e)}"}
+    return {**result, "duration_ms": round((time.perf_counter() - started_at) * 1000, 2)}
+
+
+async def _run_command(action: str, app_name: str) -> dict:
+    """
+    Run a restart, stop or start for one app, once no job is running for it and a job slot is free.
+    """
+    try:
+        async with job_utils.worker.hold_app(app_name):
+            await BULK_ACTIONS[action](app_name)
+        return {"success": True, "error": None}
+    except DokkuError as e:
+        return {"success": False, "error": str(e)}
+
+
+async def _run_job(kind: str, app_name: str):
+    """
+    Queue a job for the app and wait for the worker to finish it.
+    """
+    async with create_session() as db:
+        job = await job_utils.enqueue_job(db, kind, app_name)
+    return await job_utils.wait_for_job(job.id)
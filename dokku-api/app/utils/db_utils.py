@@ -1,54 +1,188 @@
-from models import DeploymentConfig, DeploymentConfigCreate, GitHubAppCredentials
-from sqlalchemy import text
-from sqlmodel import select, Session
+from datetime import datetime
+
+from models import AppSnapshot, DeploymentConfig, DeploymentConfigCreate, GitHubAppCredentials, GitHubResponseCache, Job
+from sqlalchemy import delete, text, update
+from sqlmodel import select
+from sqlmodel.ext.asyncio.session import AsyncSession
 
 
 # ======================================================= GitHub Credentials
-def get_all_github_app_credentials(db: Session):
+async def get_all_github_app_credentials(db: AsyncSession):
     """
     Get all GitHub App credentials
     """
-    return db.exec(select(GitHubAppCredentials)).all()
+    return (await db.exec(select(GitHubAppCredentials))).all()
 
 
-def get_github_app_credentials_by_app_id(db: Session, app_id: str):
+async def get_github_app_credentials_by_app_id(db: AsyncSession, app_id: str):
     """
     Get the GitHub App credentials for a given app ID
     """
-    return db.exec(select(GitHubAppCredentials).where(GitHubAppCredentials.app_id == app_id)).first()
+    return (await db.exec(select(GitHubAppCredentials).where(GitHubAppCredentials.app_id == app_id))).first()
 
 
-def save_github_app_credentials(db: Session, credentials: GitHubAppCredentials):
+async def save_github_app_credentials(db: AsyncSession, credentials: GitHubAppCredentials):
     """
     Save the GitHub App credentials to the database
     """
     db.add(credentials)
-    db.commit()
+    await db.commit()
+
+
+# ======================================================= GitHub response cache
+async def get_github_response_cache(db: AsyncSession, cache_key: str):
+    """
+    Get a cached GitHub API response
+    """
+    return await db.get(GitHubResponseCache, cache_key)
+
+
+async def save_github_response_cache(db: AsyncSession, cached_response: GitHubResponseCache):
+    """
+    Save a GitHub API response to the cache
+    """
+    await db.merge(cached_response)
+    await db.commit()
 
 
 # ======================================================= Deployments
-def get_deployment_config_by_app_name(db: Session, app_name: str):
+async def get_deployment_config_by_app_name(db: AsyncSession, app_name: str):
     """
     Get a deployment config by app name
     """
-    return db.exec(select(DeploymentConfig).where(DeploymentConfig.dokku_app_name == app_name)).first()
+    return (await db.exec(select(DeploymentConfig).where(DeploymentConfig.dokku_app_name == app_name))).first()
 
 
-def create_deployment_config(db: Session, deployment_config: DeploymentConfigCreate):
+async def get_auto_deploy_configs_for_branch(db: AsyncSession, repo_id: str, branch: str):
+    """
+    Get the auto-deploying deployment configs tracking a repository branch
     """
-    Create a deployment config
+    query = select(DeploymentConfig).where(
+        DeploymentConfig.github_repo_id == repo_id,
+        DeploymentConfig.branch_to_deploy == branch,
+        DeploymentConfig.auto_deploy == True,  # noqa: E712
+    )
+    return (await db.exec(query)).all()
+
+
+async def create_deployment_config(db: AsyncSession, deployment_config: DeploymentConfigCreate):
     """
-    deployment_config = DeploymentConfig.model_validate(deployment_config)
+    Create a deployment config, tracking the repository's default branch unless another branch is given
+    """
+    branch_to_deploy = deployment_config.branch_to_deploy or deployment_config.github_default_branch
+    deployment_config = DeploymentConfig.model_validate(deployment_config, update={"branch_to_deploy": branch_to_deploy})
     db.add(deployment_config)
-    db.commit()
+    await db.commit()
+    await db.refresh(deployment_config)
+    return deployment_config
+
+
+# ======================================================= Jobs
+async def get_job(db: AsyncSession, job_id: str):
+    """
+    Get a job by id
+    """
+    return await db.get(Job, job_id)
+
+
+async def list_jobs(db: AsyncSession, status: str = None, app_name: str = None, limit: int = 100):
+    """
+    List jobs, newest first, optionally filtered by status and app name
+    """
+    query = select(Job)
+    if status:
+        query = query.where(Job.status == status)
+    if app_name:
+        query = query.where(Job.app_name == app_name)
+    return (await db.exec(query.order_by(Job.created_at.desc()).limit(limit))).all()
+
+
+async def get_queued_jobs(db: AsyncSession):
+    """
+    Get all queued jobs, oldest first
+    """
+    return (await db.exec(select(Job).where(Job.status == "queued").order_by(Job.created_at))).all()
+
+
+async def get_queued_job(db: AsyncSession, kind: str, app_name: str):
+    """
+    Get the oldest queued job of a kind for an app
+    """
+    query = select(Job).where(Job.status == "queued", Job.kind == kind, Job.app_name == app_name)
+    return (await db.exec(query.order_by(Job.created_at))).first()
+
+
+async def save_job(db: AsyncSession, job: Job):
+    """
+    Save a job to the database
+    """
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    return job
+
+
+async def update_queued_job(db: AsyncSession, job_id: str, **values) -> bool:
+    """
+    Update a job only if it is still queued. Returns False if it was claimed or cancelled in the meantime.
+    """
+    result = await db.exec(update(Job).where(Job.id == job_id, Job.status == "queued").values(**values))
+    await db.commit()
+    return result.rowcount == 1
+
+
+async def claim_job(db: AsyncSession, job_id: str) -> bool:
+    """
+    Mark a queued job as running. Returns False if it was no longer queued.
+    """
+    return await update_queued_job(db, job_id, status="running", started_at=datetime.utcnow())
+
+
+async def requeue_running_jobs(db: AsyncSession):
+    """
+    Put jobs left running by a previous process back in the queue
+    """
+    jobs = (await db.exec(select(Job).where(Job.status == "running"))).all()
+    for job in jobs:
+        job.status = "queued"
+        job.started_at = None
+        db.add(job)
+    await db.commit()
+    return jobs
+
+
+# ======================================================= App snapshots
+async def list_app_snapshots(db: AsyncSession):
+    """
+    Get the snapshots of all apps
+    """
+    return (await db.exec(select(AppSnapshot))).all()
+
+
+async def save_app_snapshots(db: AsyncSession, snapshots: list):
+    """
+    Save app snapshots, replacing the previous ones in two statements rather than a merge per app
+    """
+    await db.exec(delete(AppSnapshot).where(AppSnapshot.app_name.in_([snapshot.app_name for snapshot in snapshots])))
+    db.add_all(snapshots)
+    await db.commit()
+
+
+async def delete_app_snapshots(db: AsyncSession, app_names: list):
+    """
+    Delete the snapshots of apps that no longer exist
+    """
+    await db.exec(delete(AppSnapshot).where(AppSnapshot.app_name.in_(app_names)))
+    await db.commit()
 
 
 # ======================================================= Helpers
-def health_check(db: Session):
+async def health_check(db: AsyncSession):
     """
     Health check for the database
     """
     try:
-        db.exec(text("SELECT 1"))
+        await db.exec(text("SELECT 1"))
+        return True
     except Exception as e:
         return False
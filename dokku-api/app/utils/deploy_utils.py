@@ -0,0 +1,51 @@
+import logging
+
+from database import create_session
+from dokku import dokku_commands
+from exceptions import DokkuCommandError, DokkuError
+from utils import db_utils, github_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+
+# ======================================================= Deployments
+async def deploy_app(app_name: str, git_ref: str = None, lets_encrypt: bool = False):
+    """
+    Deploy a Dokku app from the GitHub repository in its deployment config, optionally at a specific commit.
+
+    Let's Encrypt is only enabled when lets_encrypt is set, for the app's first deploy: dokku renews the
+    certificate itself, so re-issuing it on every push deploy only adds a slow step and eats into rate limits.
+
+    The installation access token is fetched when the deploy runs, so queued deploys never run with an expired token.
+    It is masked in the output and in any error, both of which end up in the job's record.
+    """
+    async with create_session() as db:
+        deployment_config = await db_utils.get_deployment_config_by_app_name(db, app_name)
+        if not deployment_config:
+            raise ValueError(f"Deployment config not found for app: {app_name}")
+
+        credentials = await github_utils.get_app_credentials(db, deployment_config.github_app_id)
+        if not credentials:
+            raise ValueError(f"GitHub app credentials not found for app ID: {deployment_config.github_app_id}")
+
+    # get repo credentials
+    client = github_utils.GitHubAppClient(credentials)
+    access_token = await client.get_installation_access_token(deployment_config.github_app_installation_id)
+    logger.info(f"Retrieved installation access token for installation ID: {deployment_config.github_app_installation_id}")
+
+    # Build GitHub URL with access token
+    git_url_with_access_token = github_utils.build_github_url_with_access_token(deployment_config.github_repo_url, access_token)
+    logger.info(f"Starting deployment from repository: {deployment_config.github_repo_url}")
+
+    try:
+        output = await dokku_commands.sync_app_from_git_url(app_name, git_url_with_access_token, git_ref)
+    except DokkuError as e:
+        # from None, so the unmasked error isn't logged as this one's cause
+        raise DokkuCommandError(str(e).replace(access_token, "***")) from None
+
+    if lets_encrypt:
+        await dokku_commands.enable_lets_encrypt(app_name)
+
+    # never persist the access token with the job output
+    return (output or "").replace(access_token, "***")
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+
+from fastapi import Request
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+CANCELLABLE_METHODS = ("GET", "HEAD")  # cancelled by default, handlers for other methods opt in with set_cancel_on_disconnect
+CANCEL_SCOPE_KEY = "cancel_on_disconnect"
+
+
+# ======================================================= Middleware
+class CancelOnDisconnectMiddleware:
+    """
+    ASGI middleware that cancels a request's handler when its client disconnects before the response is complete.
+
+    Starlette keeps running a handler after its client has gone, so a dashboard user navigating away would leave
+    the daemon command behind it holding a pooled connection until its timeout. Cancelling the handler unwinds
+    it like any other cancellation: the daemon connection is closed and coalesced reads drop the caller.
+
+    Only reads are cancelled: GET and HEAD requests, and requests whose handler opted in. A mutation cancelled
+    halfway (e.g. a deployment config saved but its dokku settings not applied) would leave an app half
+    configured, so other requests run to completion, as do GET handlers that opted out.
+
+    The original receive channel is drained by a listener task, so the disconnect is seen even by handlers that
+    never read the request; the handler reads the same messages from a queue. The handler keeps running in the
+    request's own task, which the listener cancels, so requests answered without awaiting anything don't yield
+    to the event loop. Background tasks run after the response is complete and are never cancelled.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        messages = asyncio.Queue()
+        response_complete = False
+        disconnected = False
+
+        async def receive_from_listener():
+            if disconnected and messages.empty():
+                return {"type": "http.disconnect"}
+            return await messages.get()
+
+        async def send_tracking_completion(message):
+            nonlocal response_complete
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                response_complete = True
+            await send(message)
+
+        request_task = asyncio.current_task()
+        cancelled_for_disconnect = False
+
+        async def listen_for_disconnect():
+            nonlocal disconnected, cancelled_for_disconnect
+            while True:
+                message = await receive()
+                messages.put_nowait(message)
+                if message["type"] == "http.disconnect":
+                    disconnected = True
+                    if not response_complete and scope.get(CANCEL_SCOPE_KEY, scope["method"] in CANCELLABLE_METHODS):
+                        logger.info(f"Client disconnected, cancelling {scope['method']} {scope['path']}")
+                        cancelled_for_disconnect = True
+                        request_task.cancel()
+                    return
+
+        listener = asyncio.ensure_future(listen_for_disconnect())
+        try:
+            await self.app(scope, receive_from_listener, send_tracking_completion)
+        except asyncio.CancelledError:
+            if not cancelled_for_disconnect:
+                raise
+            if hasattr(request_task, "uncancel"):
+                request_task.uncancel()
+        finally:
+            listener.cancel()
+
+
+# ======================================================= Handlers
+def set_cancel_on_disconnect(request: Request, cancel: bool):
+    """
+    Choose whether the request's handler is cancelled if its client disconnects, overriding the default for its method.
+    """
+    request.scope[CANCEL_SCOPE_KEY] = cancel
+
+
+def keep_running_on_disconnect(request: Request):
+    """
+    Route dependency for GET handlers that change state, so they run to completion if the client goes away.
+    """
+    set_cancel_on_disconnect(request, False)
@@ -1,54 +1,213 @@
+import asyncio
 import hashlib
 import hmac
 import json
 import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
 
+import httpx
+import jwt
 from dotenv import load_dotenv
-from fastapi import HTTPException, Request, Response
-from github import Auth, GithubIntegration
-from models import GitHubAppCredentials
-from sqlmodel import Session
-from utils import db_utils
+from fastapi import HTTPException, Request
+from database import create_session
+from models import GitHubAppCredentials, GitHubResponseCache
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import db_utils, metrics_utils, timing_utils
 
 # ======================================================= Config
 logger = logging.getLogger(__name__)
 
 load_dotenv()
 
+GITHUB_API_URL = os.getenv("GITHUB_API_URL", "https://api.github.com")  # overridable to test against a stub server
+GITHUB_MAX_CONCURRENCY = int(os.getenv("GITHUB_MAX_CONCURRENCY", "8"))  # max concurrent requests when fanning out
+GITHUB_PER_PAGE = 100
 
-# ======================================================= PyGithub client
+# Installation access tokens are valid for an hour, refresh them this long before they expire
+ACCESS_TOKEN_REFRESH_MARGIN = timedelta(minutes=5)
+
+# App JWTs may be valid for at most 10 minutes, issue them for 9 and refresh a minute before they expire
+APP_JWT_LIFETIME = timedelta(minutes=9)
+APP_JWT_REFRESH_MARGIN = timedelta(minutes=1)
+
+# Process-wide caches shared by all clients, so webhooks and deploys don't re-sign JWTs or mint tokens each time
+_app_jwts = {}  # app id -> (private key, jwt, expires_at)
+_access_tokens = {}  # (app id, installation id) -> (token, expires_at)
+_credentials = {}  # app id -> GitHubAppCredentials, written through on save so webhooks skip the db
+
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+# ======================================================= HTTP client
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get the shared keep-alive HTTP client for the GitHub API.
+    """
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            base_url=GITHUB_API_URL,
+            headers={"Accept": "application/vnd.github+json", "X-GitHub-Api-Version": "2022-11-28"},
+            limits=httpx.Limits(max_connections=GITHUB_MAX_CONCURRENCY * 2, max_keepalive_connections=GITHUB_MAX_CONCURRENCY),
+            timeout=httpx.Timeout(30.0, connect=10.0),
+            event_hooks={"request": [_start_request_timer], "response": [_observe_request_latency]},
+        )
+    return _http_client
+
+
+async def close_http_client():
+    """
+    Close the shared HTTP client. Called on shutdown.
+    """
+    global _http_client
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
+
+
+async def _start_request_timer(request: httpx.Request):
+    request.extensions["started_at"] = time.perf_counter()
+
+
+async def _observe_request_latency(response: httpx.Response):
+    started_at = response.request.extensions.get("started_at")
+    if started_at is not None:
+        elapsed = time.perf_counter() - started_at
+        metrics_utils.GITHUB_REQUEST_SECONDS.observe(elapsed, response.request.method, str(response.status_code))
+        timing_utils.record("github", elapsed)
+
+
+# ======================================================= GitHub App client
 class GitHubAppClient:
     def __init__(self, credentials: GitHubAppCredentials):
-        self.auth = Auth.AppAuth(credentials.app_id, credentials.private_key_encrypted)
-        self.integration = GithubIntegration(auth=self.auth, per_page=100)
+        self.app_id = str(credentials.app_id)
+        self.private_key = credentials.private_key_encrypted  # TODO: decrypt here once implemented
 
-    def get_installations(self):
+    async def get_installations(self) -> list:
         """Get all installations of the GitHub App"""
-        return self.integration.get_installations()
+        return await _get_all_pages("/app/installations", self._app_headers(), cache_scope=f"app:{self.app_id}")
 
-    def get_installation_access_token(self, installation_id):
-        """Get Github instance for a specific installation"""
-        return self.integration.get_access_token(installation_id).token
+    async def get_installation_repositories(self, installation_id) -> list:
+        """Get all repositories a specific installation can access"""
+        headers = await self._installation_headers(installation_id)
+        cache_scope = f"installation:{self.app_id}:{installation_id}"
+        return await _get_all_pages("/installation/repositories", headers, items_key="repositories", cache_scope=cache_scope)
 
+    async def get_installation_access_token(self, installation_id) -> str:
+        """Get an access token for a specific installation, reusing a cached one until shortly before it expires"""
+        key = (self.app_id, str(installation_id))
+        cached = _access_tokens.get(key)
+        if cached and cached[1] - ACCESS_TOKEN_REFRESH_MARGIN > datetime.now(timezone.utc):
+            return cached[0]
 
-# ======================================================= Webhooks
-async def handle_push_event(payload: dict, credentials: GitHubAppCredentials):
+        response = await get_http_client().post(f"/app/installations/{installation_id}/access_tokens", headers=self._app_headers())
+        response.raise_for_status()
+        data = response.json()
+
+        expires_at = datetime.fromisoformat(data["expires_at"].replace("Z", "+00:00"))
+        _access_tokens[key] = (data["token"], expires_at)
+        return data["token"]
+
+    def _app_headers(self) -> dict:
+        return {"Authorization": f"Bearer {self._get_app_jwt()}"}
+
+    async def _installation_headers(self, installation_id) -> dict:
+        return {"Authorization": f"token {await self.get_installation_access_token(installation_id)}"}
+
+    def _get_app_jwt(self) -> str:
+        """
+        Get a JWT authenticating as the app, reusing a cached one until shortly before it expires.
+        """
+        now = datetime.now(timezone.utc)
+        cached = _app_jwts.get(self.app_id)
+        if cached and cached[0] == self.private_key and cached[2] - APP_JWT_REFRESH_MARGIN > now:
+            return cached[1]
+
+        expires_at = now + APP_JWT_LIFETIME
+        payload = {"iat": int((now - timedelta(seconds=60)).timestamp()), "exp": int(expires_at.timestamp()), "iss": self.app_id}
+        app_jwt = jwt.encode(payload, self.private_key, algorithm="RS256")
+        _app_jwts[self.app_id] = (self.private_key, app_jwt, expires_at)
+        return app_jwt
+
+
+async def get_installations_with_repositories(client: GitHubAppClient) -> list:
+    """
+    Get an app's installations with their repositories, fetching every installation's repositories concurrently.
+
+    Returns a list of (installation, repositories) tuples.
     """
-    Handle push events from GitHub
+    installations = await client.get_installations()
+    semaphore = asyncio.Semaphore(GITHUB_MAX_CONCURRENCY)
+
+    async def get_repositories(installation):
+        async with semaphore:
+            return await client.get_installation_repositories(installation["id"])
+
+    repositories = await asyncio.gather(*[get_repositories(installation) for installation in installations])
+    return list(zip(installations, repositories))
+
+
+async def _get_all_pages(url: str, headers: dict, items_key: str = None, cache_scope: str = None) -> list:
+    """
+    GET every page of a paginated GitHub listing by following its Link headers.
+
+    With a cache_scope, pages are fetched conditionally against the response cache and served
+    from it on a 304, which doesn't count against GitHub's rate limit.
     """
-    client = GitHubAppClient(credentials)
-    installation_id = payload["installation"]["id"]
+    items = []
+    url = f"{url}?per_page={GITHUB_PER_PAGE}"
+    while url:
+        if cache_scope:
+            data, url = await _get_page_cached(url, headers, f"{cache_scope}:{url}")
+        else:
+            response = await get_http_client().get(url, headers=headers)
+            response.raise_for_status()
+            data, url = response.json(), response.links.get("next", {}).get("url")
+
+        items.extend(data[items_key] if items_key else data)
+    return items
+
+
+async def _get_page_cached(url: str, headers: dict, cache_key: str):
+    """
+    GET a page with If-None-Match/If-Modified-Since from the response cache. Returns the page data and the next page URL.
+    """
+    async with create_session() as db:
+        cached = await db_utils.get_github_response_cache(db, cache_key)
+
+    conditional_headers = dict(headers)
+    if cached and cached.etag:
+        conditional_headers["If-None-Match"] = cached.etag
+    if cached and cached.last_modified:
+        conditional_headers["If-Modified-Since"] = cached.last_modified
 
-    try:
-        access_token = client.get_installation_access_token(installation_id)
-        logger.info(f"Access token: {access_token}")
-    except Exception as e:
-        logger.error(f"Error handling push event: {str(e)}")
-        return Response(status_code=500)
+    response = await get_http_client().get(url, headers=conditional_headers)
+    if response.status_code == 304 and cached:
+        logger.debug(f"GitHub response not modified, serving from cache: {url}")
+        return cached.body, cached.next_url
 
-    return Response(status_code=200)
+    response.raise_for_status()
+    data = response.json()
+    next_url = response.links.get("next", {}).get("url")
 
+    if response.headers.get("ETag") or response.headers.get("Last-Modified"):
+        async with create_session() as db:
+            cached_response = GitHubResponseCache(
+                cache_key=cache_key,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                body=data,
+                next_url=next_url,
+            )
+            await db_utils.save_github_response_cache(db, cached_response)
 
+    return data, next_url
+
+
+# ======================================================= Webhooks
 async def verify_signature(request: Request, credentials: GitHubAppCredentials):
     """Verify that the payload was sent from GitHub by validating SHA256.
 
@@ -104,8 +263,33 @@ def create_app_manifest(dokku_api_url: str, webhook_url: str, callback_url: str)
     return json.dumps(manifest)
 
 
+async def convert_app_manifest(code: str) -> Optional[dict]:
+    """
+    Exchange the temporary code from the manifest flow for the new app's credentials. Returns None on failure.
+    """
+    response = await get_http_client().post(f"/app-manifests/{code}/conversions")
+
+    if response.status_code != 201:
+        logger.error(f"Failed to create GitHub App. Status code: {response.status_code}, Response: {response.text}")
+        return None
+
+    return response.json()
+
+
 # ======================================================= Credentials
-def save_github_app_credentials(db: Session, app_data: dict):
+async def get_app_credentials(db: AsyncSession, app_id) -> Optional[GitHubAppCredentials]:
+    """
+    Get a GitHub App's credentials, from memory once they have been loaded. Returns None if the app is unknown.
+    """
+    credentials = _credentials.get(str(app_id))
+    if credentials is None:
+        credentials = await db_utils.get_github_app_credentials_by_app_id(db, str(app_id))
+        if credentials is not None:
+            _credentials[str(app_id)] = credentials
+    return credentials
+
+
+async def save_github_app_credentials(db: AsyncSession, app_data: dict):
     """
     Save the GitHub App credentials to the database
     """
@@ -119,7 +303,8 @@ def save_github_app_credentials(db: Session, app_data: dict):
     )
 
     logger.info(f"Saving GitHub App credentials for app id: {credentials.app_id}")
-    db_utils.save_github_app_credentials(db, credentials)
+    await db_utils.save_github_app_credentials(db, credentials)
+    _credentials[str(credentials.app_id)] = credentials
 
 
 def build_github_url_with_access_token(repo_url: str, access_token: str) -> str:
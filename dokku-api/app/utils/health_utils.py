@@ -0,0 +1,126 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from database import create_session
+from dokku import dokku_commands
+from dotenv import load_dotenv
+from utils import db_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "10"))  # seconds between background probes
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "5"))  # max seconds each check may take
+HEALTH_PROBE_MAX_AGE = HEALTH_PROBE_INTERVAL * 3  # older results mean the prober is stuck, so the process isn't ready
+
+
+# ======================================================= Prober
+class HealthProber:
+    """
+    Checks the database and the dokku daemon in the background and keeps the last result,
+    so health endpoints polled by the dashboard and orchestrators never touch either.
+
+    The daemon is checked with "dokku version" rather than apps:list, which gets slower with every app on the host.
+    """
+
+    def __init__(self, interval: float, timeout: float):
+        self.interval = interval
+        self.timeout = timeout
+        self.result: Optional[dict] = None
+        self._probed_at = 0.0
+        self._probing = None  # probe in progress, shared by everyone asking for a result meanwhile
+        self._task = None
+
+    async def start(self):
+        self._task = asyncio.ensure_future(self._probe_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def get_result(self) -> dict:
+        """
+        Get the last probe result, probing now if there hasn't been one yet.
+        """
+        if self.result is None:
+            await self.probe()
+        return self.result
+
+    def is_ready(self) -> bool:
+        """
+        Check the last probe passed and is recent enough to trust.
+        """
+        if self.result is None or self.result["status"] != "healthy":
+            return False
+        return time.monotonic() - self._probed_at < HEALTH_PROBE_MAX_AGE
+
+    async def probe(self) -> dict:
+        """
+        Probe now, joining the probe in progress if there is one.
+        """
+        if self._probing is None:
+            self._probing = asyncio.ensure_future(self._probe())
+            self._probing.add_done_callback(lambda _: setattr(self, "_probing", None))
+        return await asyncio.shield(self._probing)
+
+    async def _probe(self) -> dict:
+        """
+        Check the database and the daemon concurrently and store the result.
+        """
+        started_at = time.perf_counter()
+        database, dokku = await asyncio.gather(self._check(self._check_database), self._check(self._check_dokku))
+
+        healthy = database["status"] == "connected" and dokku["status"] == "connected"
+        self.result = {
+            "status": "healthy" if healthy else "unhealthy",
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "latency_ms": round((time.perf_counter() - started_at) * 1000, 2),
+            "checks": {"database": database, "dokku": dokku},
+        }
+        self._probed_at = time.monotonic()
+        if not healthy:
+            logger.warning(f"Health probe failed: database {database['status']}, dokku {dokku['status']}")
+        return self.result
+
+    async def _probe_loop(self):
+        while True:
+            try:
+                await self.probe()
+            except Exception as e:
+                logger.error(f"Health probe crashed: {str(e)}")
+            await asyncio.sleep(self.interval)
+
+    async def _check(self, check) -> dict:
+        """
+        Run a single check with the probe timeout, timing it.
+        """
+        started_at = time.perf_counter()
+        try:
+            await asyncio.wait_for(check(), timeout=self.timeout)
+            result = {"status": "connected"}
+        except asyncio.TimeoutError:
+            result = {"status": "disconnected", "error": f"Timed out after {self.timeout} seconds"}
+        except Exception as e:
+            result = {"status": "disconnected", "error": str(e)}
+        result["latency_ms"] = round((time.perf_counter() - started_at) * 1000, 2)
+        return result
+
+    async def _check_database(self):
+        async with create_session() as db:
+            if not await db_utils.health_check(db):
+                raise Exception("Database query failed")
+
+    async def _check_dokku(self):
+        await dokku_commands.get_version(timeout=self.timeout)
+
+
+prober = HealthProber(HEALTH_PROBE_INTERVAL, HEALTH_PROBE_TIMEOUT)
+
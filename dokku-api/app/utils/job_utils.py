@@ -0,0 +1,243 @@
+import asyncio
+import logging
+import os
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from database import create_session
+from dokku import dokku_client, dokku_commands
+from dotenv import load_dotenv
+from models import Job
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import db_utils, deploy_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+JOB_CONCURRENCY = int(os.getenv("JOB_CONCURRENCY", "2"))  # max jobs (builds) running at once across all apps
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "5"))  # seconds between queue checks when not notified
+JOB_WAIT_POLL_INTERVAL = 1.0  # seconds between status checks while waiting on a job
+
+JOB_FINISHED_STATUSES = ("succeeded", "failed", "cancelled")
+
+# Job kinds and the coroutine that runs each of them, called with the job's app name and args
+JOB_HANDLERS = {
+    "rebuild": lambda app_name: dokku_commands.rebuild_app(app_name),
+    "sync": lambda app_name, git_url: dokku_commands.sync_app_from_git_url(app_name, git_url),
+    "deploy": lambda app_name, git_ref=None, lets_encrypt=False: deploy_utils.deploy_app(app_name, git_ref, lets_encrypt),
+}
+
+
+# ======================================================= Worker
+class JobWorker:
+    """
+    Runs queued jobs from the database.
+
+    At most `concurrency` jobs run at once, and jobs for the same app run one at a time in the order they were queued.
+    Jobs still running when the process stops are put back in the queue on the next start.
+
+    Work run outside the queue (e.g. a streamed rebuild) holds an app's slot with hold_app, so it counts towards
+    the limit and never overlaps a job for the same app.
+    """
+
+    def __init__(self, concurrency: int):
+        self.concurrency = concurrency
+        self._tasks = {}  # job id -> task
+        self._running_apps = set()
+        self._held = 0  # slots held by hold_app
+        self._cancel_requested = set()
+        self._freed = None
+        self._wake = None
+        self._dispatcher = None
+
+    async def start(self):
+        async with create_session() as db:
+            for job in await db_utils.requeue_running_jobs(db):
+                logger.info(f"Requeued interrupted job: {job.id} ({job.kind} {job.app_name})")
+
+        self._freed = asyncio.Condition()
+        self._wake = asyncio.Event()
+        self._dispatcher = asyncio.ensure_future(self._dispatch_loop())
+
+    async def stop(self):
+        tasks = [task for task in [self._dispatcher, *self._tasks.values()] if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._dispatcher = None
+
+    def notify(self):
+        """
+        Wake the dispatcher, e.g. after a job was queued.
+        """
+        if self._wake is not None:
+            self._wake.set()
+
+    def is_free(self, app_name: str) -> bool:
+        return app_name not in self._running_apps and len(self._tasks) + self._held < self.concurrency
+
+    @asynccontextmanager
+    async def hold_app(self, app_name: str):
+        """
+        Hold a job slot for an app while running work outside the queue, waiting for one to be free first.
+        """
+        async with self._freed:
+            await self._freed.wait_for(lambda: self.is_free(app_name))
+            self._running_apps.add(app_name)
+            self._held += 1
+        try:
+            yield
+        finally:
+            self._running_apps.discard(app_name)
+            self._held -= 1
+            await self._release()
+
+    async def _release(self):
+        async with self._freed:
+            self._freed.notify_all()
+        self.notify()
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a running job. Returns False if the job isn't running in this worker.
+
+        NOTE: This stops waiting on the daemon and closes its connection; dokku may still finish the command on the host.
+        """
+        task = self._tasks.get(job_id)
+        if task is None:
+            return False
+        self._cancel_requested.add(job_id)
+        task.cancel()
+        return True
+
+    async def _dispatch_loop(self):
+        while True:
+            try:
+                await self._dispatch()
+            except Exception as e:
+                logger.error(f"Failed to dispatch jobs: {str(e)}")
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _dispatch(self):
+        if len(self._tasks) + self._held >= self.concurrency:
+            return
+
+        async with create_session() as db:
+            for job in await db_utils.get_queued_jobs(db):
+                if len(self._tasks) + self._held >= self.concurrency:
+                    break
+                if job.app_name in self._running_apps:
+                    continue  # serialize jobs per app
+                if not await db_utils.claim_job(db, job.id):
+                    continue  # cancelled since it was listed
+
+                logger.info(f"Starting job: {job.id} ({job.kind} {job.app_name})")
+
+                self._running_apps.add(job.app_name)
+                self._tasks[job.id] = asyncio.ensure_future(self._run(job.id, job.kind, job.app_name, dict(job.args or {})))
+
+    async def _run(self, job_id: str, kind: str, app_name: str, args: dict):
+        status, output, error = "succeeded", None, None
+        try:
+            output = await JOB_HANDLERS[kind](app_name, **args)
+        except asyncio.CancelledError:
+            if job_id not in self._cancel_requested:
+                raise  # worker shutting down, leave the job running so it is requeued on restart
+            status, error = "cancelled", "Cancelled while running"
+        except Exception as e:
+            error = dokku_client.mask_credentials(str(e))  # e.g. a sync job's git URL echoed back in the error
+            logger.error(f"Job failed: {job_id} ({kind} {app_name}): {error}")
+            status = "failed"
+        finally:
+            self._tasks.pop(job_id, None)
+            self._running_apps.discard(app_name)
+            self._cancel_requested.discard(job_id)
+
+        async with create_session() as db:
+            job = await db_utils.get_job(db, job_id)
+            job.status = status
+            job.output = output if output is None else dokku_client.mask_credentials(str(output))
+            job.error = error
+            job.finished_at = datetime.utcnow()
+            await db_utils.save_job(db, job)
+
+        logger.info(f"Finished job: {job_id} ({kind} {app_name}) with status: {status}")
+        await self._release()
+
+
+worker = JobWorker(JOB_CONCURRENCY)
+
+
+# ======================================================= Jobs
+async def enqueue_job(db: AsyncSession, kind: str, app_name: str, **args) -> Job:
+    """
+    Queue a job for the worker.
+    """
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+
+    job = await db_utils.save_job(db, Job(kind=kind, app_name=app_name, args=args))
+    logger.info(f"Queued job: {job.id} ({kind} {app_name})")
+    worker.notify()
+    return job
+
+
+async def wait_for_job(job_id: str) -> Job:
+    """
+    Wait for a job to finish, returning it in its final status.
+    """
+    while True:
+        async with create_session() as db:
+            job = await db_utils.get_job(db, job_id)
+        if job.status in JOB_FINISHED_STATUSES:
+            return job
+        await asyncio.sleep(JOB_WAIT_POLL_INTERVAL)
+
+
+async def stream_holding_app(app_name: str, events):
+    """
+    Pass through a stream of events while holding the app's job slot, yielding a "waiting" event first if it is busy.
+    """
+    if not worker.is_free(app_name):
+        yield {"event": "waiting", "app": app_name, "message": "Waiting for running jobs to finish"}
+    async with worker.hold_app(app_name):
+        async for event in events:
+            yield event
+
+
+async def enqueue_or_update_job(db: AsyncSession, kind: str, app_name: str, **args) -> Job:
+    """
+    Queue a job, or if one of the same kind is already waiting for the app, merge args into its args instead.
+
+    Used to collapse bursts of requests for the same work into a single pending job.
+    """
+    job = await db_utils.get_queued_job(db, kind, app_name)
+    if job is None or not await db_utils.update_queued_job(db, job.id, args={**(job.args or {}), **args}):
+        return await enqueue_job(db, kind, app_name, **args)
+
+    logger.info(f"Updated queued job: {job.id} ({kind} {app_name})")
+    await db.refresh(job)
+    return job
+
+
+async def cancel_job(db: AsyncSession, job: Job) -> Job:
+    """
+    Cancel a queued or running job.
+    """
+    if job.status == "queued":
+        cancelled = await db_utils.update_queued_job(db, job.id, status="cancelled", finished_at=datetime.utcnow())
+        await db.refresh(job)
+        if cancelled:
+            return job
+
+    if job.status == "running" and worker.cancel(job.id):
+        return job  # the worker records the cancellation once the task has stopped
+
+    raise ValueError(f"Job can't be cancelled in status: {job.status}")
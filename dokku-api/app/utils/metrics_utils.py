@@ -0,0 +1,142 @@
+import math
+from bisect import bisect_left
+from typing import Dict, List, Tuple
+
+# ======================================================= Config
+# Latency buckets in seconds, from sub-millisecond cache-adjacent calls up to long running builds
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 300.0)
+
+
+# ======================================================= Metric types
+class Metric:
+    """
+    Base class for metrics kept in memory and rendered in the Prometheus text exposition format.
+
+    Label values are passed positionally in the order of labelnames, keeping updates on the hot path to a dict lookup.
+    """
+
+    type_name = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        registry.append(self)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type_name}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+    def _labels(self, label_values: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, label_values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def _render_samples(self) -> List[str]:
+        return [f"{self.name}{self._labels(labels)} {_format(value)}" for labels, value in self._values.items()]
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._values: Dict[tuple, float] = {}
+
+    def inc(self, *label_values, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def dec(self, *label_values, amount: float = 1.0):
+        self._values[label_values] = self._values.get(label_values, 0.0) - amount
+
+    def set(self, value: float, *label_values):
+        self._values[label_values] = value
+
+    def _render_samples(self) -> List[str]:
+        if not self._values and not self.labelnames:
+            return [f"{self.name} 0"]
+        return [f"{self.name}{self._labels(labels)} {_format(value)}" for labels, value in self._values.items()]
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Tuple[str, ...] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[tuple, list] = {}  # label values -> [per-bucket counts (last one is +Inf), sum]
+
+    def observe(self, value: float, *label_values):
+        series = self._series.get(label_values)
+        if series is None:
+            series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+        series[0][bisect_left(self.buckets, value)] += 1
+        series[1] += value
+
+    def _render_samples(self) -> List[str]:
+        lines = []
+        for labels, (counts, total) in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = 'le="' + _format(bound) + '"'
+                lines.append(f"{self.name}_bucket{self._labels(labels, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(labels)} {_format(total)}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+registry: List[Metric] = []
+
+
+# ======================================================= Exposition
+def render_metrics() -> str:
+    """
+    Render every registered metric in the Prometheus text exposition format.
+    """
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def _format(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value)) if abs(value) < 1e15 else repr(float(value))
+    return repr(float(value))
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+# ======================================================= Metrics
+DOKKU_CONNECT_SECONDS = Histogram("dokku_daemon_connect_seconds", "Time to open a connection to the dokku daemon socket.")
+DOKKU_COMMAND_SECONDS = Histogram("dokku_command_duration_seconds", "Dokku daemon command round trip time.", ("verb",))
+DOKKU_PARSE_SECONDS = Histogram("dokku_parse_duration_seconds", "Time to parse a dokku command's output.", ("verb",))
+DOKKU_COMMANDS_IN_FLIGHT = Gauge("dokku_commands_in_flight", "Dokku daemon commands currently running.")
+DOKKU_TIMEOUTS = Counter("dokku_command_timeouts_total", "Dokku daemon commands that timed out.", ("verb",))
+DOKKU_DAEMON_ERRORS = Counter("dokku_daemon_errors_total", "Errors talking to the dokku daemon, by exception type.", ("type",))
+DOKKU_COMMAND_FAILURES = Counter("dokku_command_failures_total", "Dokku commands that failed or returned unparseable output.", ("verb", "type"))
+DOKKU_BREAKER_STATE = Gauge("dokku_circuit_breaker_state", "Dokku daemon circuit breaker state: 0 closed, 1 half-open, 2 open.")
+DOKKU_BREAKER_TRIPS = Counter("dokku_circuit_breaker_trips_total", "Times the dokku daemon circuit breaker opened.")
+DOKKU_BREAKER_REJECTIONS = Counter("dokku_circuit_breaker_rejections_total", "Dokku commands failed fast while the circuit breaker was open.")
+GITHUB_REQUEST_SECONDS = Histogram("github_request_duration_seconds", "GitHub API request latency.", ("method", "status"))
@@ -0,0 +1,153 @@
+import asyncio
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import time
+from datetime import datetime, timezone
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SLOW_REQUEST_PROFILE_MS = float(os.getenv("SLOW_REQUEST_PROFILE_MS", "0"))  # profile requests slower than this, 0 disables
+PROFILE_DIR = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_RING_SIZE = int(os.getenv("PROFILE_RING_SIZE", "20"))  # oldest captures are deleted beyond this many
+PROFILE_EXCLUDED_PATHS = ("/debug", "/metrics")  # reading captures shouldn't push them out of the ring
+PROFILE_EXCLUDED_MEDIA_TYPES = (b"text/event-stream", b"application/x-ndjson")  # streams stay open for as long as the client listens
+PROFILE_SORT_KEYS = [sort_key.value for sort_key in pstats.SortKey]  # e.g. "cumulative", "time", "calls"
+PROFILE_MAX_LIMIT = 1000  # functions listed in a text report
+
+# "<unix ms>_<duration ms>_<method>_<path slug>.prof"
+PROFILE_NAME_PATTERN = re.compile(r"^(\d+)_(\d+)_([A-Z]+)_([\w.-]*)\.prof$")
+
+# cProfile hooks the whole thread, so only one request is profiled at a time
+_profiling = False
+
+
+# ======================================================= Middleware
+class SlowRequestProfilerMiddleware:
+    """
+    ASGI middleware that profiles requests with cProfile and keeps the ones slower than SLOW_REQUEST_PROFILE_MS.
+
+    Requests arriving while another is being profiled run unprofiled. Everything else the event loop runs
+    meanwhile shows up in the capture too, so read it alongside the request's Server-Timing header.
+    Profiling stops, without saving, as soon as a streaming response starts: a log or build stream stays open
+    for as long as the client listens, and would hold the profiler slot and trace the whole event loop meanwhile.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        global _profiling
+        if scope["type"] != "http" or not SLOW_REQUEST_PROFILE_MS or _profiling or scope["path"].startswith(PROFILE_EXCLUDED_PATHS):
+            await self.app(scope, receive, send)
+            return
+
+        _profiling = True
+        profiler = cProfile.Profile()
+        streaming = False
+
+        def stop_profiling():
+            global _profiling
+            profiler.disable()
+            _profiling = False
+
+        async def send_stopping_for_streams(message):
+            nonlocal streaming
+            if message["type"] == "http.response.start" and _is_stream(message):
+                streaming = True
+                stop_profiling()
+            await send(message)
+
+        started_at = time.perf_counter()
+        profiler.enable()
+        try:
+            await self.app(scope, receive, send_stopping_for_streams)
+        finally:
+            if not streaming:
+                stop_profiling()
+
+        duration_ms = (time.perf_counter() - started_at) * 1000
+        if not streaming and duration_ms >= SLOW_REQUEST_PROFILE_MS:
+            try:
+                await asyncio.to_thread(save_profile, profiler, scope["method"], scope["path"], duration_ms)
+            except Exception as e:
+                logger.error(f"Failed to save profile for {scope['method']} {scope['path']}: {str(e)}")
+
+
+def _is_stream(message: dict) -> bool:
+    """
+    Check whether a response start message is for a streaming response.
+    """
+    content_type = dict(message.get("headers", [])).get(b"content-type", b"")
+    return content_type.startswith(PROFILE_EXCLUDED_MEDIA_TYPES)
+
+
+# ======================================================= Profile ring
+def save_profile(profiler: cProfile.Profile, method: str, path: str, duration_ms: float) -> str:
+    """
+    Write a capture to the profile directory, deleting the oldest ones beyond the ring size. Returns its name.
+    """
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = re.sub(r"[^\w.-]+", "-", path).strip("-")[:80]
+    name = f"{int(time.time() * 1000)}_{int(duration_ms)}_{method}_{slug}.prof"
+    profiler.dump_stats(os.path.join(PROFILE_DIR, name))
+    logger.warning(f"Slow request {method} {path} took {duration_ms:.0f}ms, saved profile: {name}")
+
+    for stale in list_profiles()[PROFILE_RING_SIZE:]:
+        os.remove(os.path.join(PROFILE_DIR, stale["name"]))
+    return name
+
+
+def list_profiles() -> list:
+    """
+    List the saved captures, newest first.
+    """
+    if not os.path.isdir(PROFILE_DIR):
+        return []
+
+    profiles = []
+    for name in os.listdir(PROFILE_DIR):
+        match = PROFILE_NAME_PATTERN.match(name)
+        if not match:
+            continue
+        created_ms, duration_ms, method, slug = match.groups()
+        profiles.append(
+            {
+                "name": name,
+                "method": method,
+                "path_slug": slug,
+                "duration_ms": int(duration_ms),
+                "created_at": datetime.fromtimestamp(int(created_ms) / 1000, tz=timezone.utc).isoformat(),
+                "size": os.path.getsize(os.path.join(PROFILE_DIR, name)),
+            }
+        )
+    return sorted(profiles, key=lambda profile: profile["name"], reverse=True)
+
+
+def get_profile_path(name: str) -> Optional[str]:
+    """
+    Get the path of a saved capture, or None if there is no capture with that name.
+    """
+    if not PROFILE_NAME_PATTERN.match(name):
+        return None
+    path = os.path.join(PROFILE_DIR, name)
+    return path if os.path.isfile(path) else None
+
+
+def format_profile(path: str, sort: str = "cumulative", limit: int = 50) -> str:
+    """
+    Render a capture as a pstats text report of its top functions.
+    """
+    output = io.StringIO()
+    stats = pstats.Stats(path, stream=output)
+    stats.strip_dirs().sort_stats(sort).print_stats(limit)
+    return output.getvalue()
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional
+
+from database import create_session
+from dokku import dokku_commands, dokku_parser
+from dotenv import load_dotenv
+from exceptions import DokkuError, DokkuUnavailableError
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from models import AppSnapshot
+from utils import db_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+SNAPSHOT_TTL = float(os.getenv("SNAPSHOT_TTL", "60"))  # seconds before an app's snapshot is refreshed
+SNAPSHOT_VIEWED_TTL = float(os.getenv("SNAPSHOT_VIEWED_TTL", "10"))  # the same for apps viewed within SNAPSHOT_VIEW_WINDOW
+SNAPSHOT_VIEW_WINDOW = float(os.getenv("SNAPSHOT_VIEW_WINDOW", "300"))
+SNAPSHOT_LIST_INTERVAL = float(os.getenv("SNAPSHOT_LIST_INTERVAL", "30"))  # seconds between checks for created / destroyed apps
+SNAPSHOT_BATCH_SIZE = int(os.getenv("SNAPSHOT_BATCH_SIZE", "4"))  # apps refreshed one by one, more are due at once and the fleet is swept
+SNAPSHOT_TICK = 1.0
+SNAPSHOT_RETRY_INTERVAL = 10.0  # seconds to wait after a failed refresh, e.g. while the daemon is down
+
+STALE_AFTER_HEADER = "X-Stale-After"
+
+# snapshot column -> (single app read, fleet-wide read keyed by app name)
+REPORTS = {
+    "app_report": (dokku_commands.get_app_report, dokku_commands.get_all_app_reports),
+    "ps_report": (dokku_commands.get_app_process_report, dokku_commands.get_all_process_reports),
+    "domains_report": (dokku_commands.app_domains_report, dokku_commands.get_all_domains_reports),
+}
+
+
+# ======================================================= Refresher
+class SnapshotRefresher:
+    """
+    Keeps the app snapshot table current in the background, so app reads never wait on the daemon.
+
+    Reads are served from an in-memory copy of the table's rows: a session per read would cost several times
+    more than the command cache it replaces. The table makes the snapshot survive restarts.
+
+    Each tick refreshes the apps whose snapshots are due: first apps changed by a command, then stale ones,
+    recently viewed apps before the rest. Viewed apps also go stale sooner. A handful of apps are refreshed
+    with single-app reports; when more are due at once (on first start, after arbitrary commands) the whole
+    fleet is swept with one fleet-wide call per report instead.
+    """
+
+    def __init__(self):
+        self.list_stale_after: Optional[datetime] = None
+        self._snapshots: Dict[str, AppSnapshot] = {}
+        self._app_names: Optional[list] = None  # sorted names of the snapshotted apps, rebuilt when apps come and go
+        self._stale_at: Dict[str, float] = {}  # app name -> monotonic time its snapshot goes stale
+        self._viewed: Dict[str, float] = {}  # app name -> monotonic time it was last read
+        self._dirty = set()
+        self._all_dirty = False
+        self._list_due = 0.0
+        self._wake = None
+        self._task = None
+        dokku_commands.add_change_listener(self.mark_dirty)
+
+    async def start(self):
+        # snapshots saved by a previous process are served until their refresh comes round
+        now, utcnow = time.monotonic(), datetime.utcnow()
+        async with create_session() as db:
+            for snapshot in await db_utils.list_app_snapshots(db):
+                self._snapshots[snapshot.app_name] = snapshot
+                self._stale_at[snapshot.app_name] = now + (snapshot.stale_after - utcnow).total_seconds()
+        self._app_names = None
+
+        self._wake = asyncio.Event()
+        self._task = asyncio.ensure_future(self._refresh_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def get(self, app_name: str) -> Optional[AppSnapshot]:
+        return self._snapshots.get(app_name)
+
+    def app_names(self) -> list:
+        if self._app_names is None:
+            self._app_names = sorted(self._snapshots)
+        return self._app_names
+
+    def mark_dirty(self, app_name: str = None):
+        """
+        Refresh an app's snapshot on the next tick, or every app's if no name is given.
+        """
+        if app_name is None:
+            self._all_dirty = True
+        else:
+            self._dirty.add(app_name)
+        if self._wake is not None:
+            self._wake.set()
+
+    def mark_viewed(self, app_name: str):
+        """
+        Record a read of an app, keeping its snapshot on the shorter viewed TTL for a while.
+        """
+        now = time.monotonic()
+        self._viewed[app_name] = now
+        if app_name in self._stale_at:
+            self._stale_at[app_name] = min(self._stale_at[app_name], now + SNAPSHOT_VIEWED_TTL)
+
+    async def refresh_due(self):
+        """
+        Refresh the snapshots that are due, checking for created and destroyed apps first if it is time to.
+        """
+        now = time.monotonic()
+        self._viewed = {app_name: viewed_at for app_name, viewed_at in self._viewed.items() if now - viewed_at < SNAPSHOT_VIEW_WINDOW}
+        if now >= self._list_due:
+            await self._sync_app_list()
+
+        if self._all_dirty:
+            self._all_dirty = False
+            self._dirty.update(self._stale_at)
+        dirty, self._dirty = list(self._dirty), set()
+
+        stale = [app_name for app_name, stale_at in self._stale_at.items() if stale_at <= now and app_name not in dirty]
+        stale.sort(key=lambda app_name: (app_name not in self._viewed, self._stale_at[app_name]))
+
+        due = dirty + stale
+        try:
+            if len(due) > SNAPSHOT_BATCH_SIZE:
+                await self._sweep()
+            elif due:
+                await self._refresh_apps(due)
+        except BaseException:
+            self._dirty.update(dirty)  # still changed, retry them once the daemon answers again
+            raise
+
+    async def _refresh_loop(self):
+        while True:
+            interval = SNAPSHOT_TICK
+            try:
+                await self.refresh_due()
+            except Exception as e:
+                logger.error(f"Snapshot refresh failed: {str(e)}")
+                interval = SNAPSHOT_RETRY_INTERVAL
+
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def _sync_app_list(self):
+        """
+        Queue snapshots of created apps and delete those of destroyed apps.
+        """
+        app_names = set(await dokku_commands.list_apps(fresh=True))
+        await self._forget([app_name for app_name in self._stale_at if app_name not in app_names])
+        self._dirty.update(app_name for app_name in app_names if app_name not in self._stale_at)
+
+        self._list_due = time.monotonic() + SNAPSHOT_LIST_INTERVAL
+        self.list_stale_after = datetime.utcnow() + timedelta(seconds=SNAPSHOT_LIST_INTERVAL)
+
+    async def _refresh_apps(self, app_names: list):
+        """
+        Refresh a few apps with single-app reports.
+
+        An app whose report fails is most likely destroyed, so the app list is checked next. If the circuit breaker
+        refused a report the apps that were refreshed are still saved before raising, leaving the rest due.
+        """
+        results = await asyncio.gather(*[self._fetch_app(app_name) for app_name in app_names], return_exceptions=True)
+
+        snapshots, unavailable = [], None
+        for app_name, result in zip(app_names, results):
+            if isinstance(result, DokkuUnavailableError):
+                unavailable = result  # the daemon wasn't asked, says nothing about the app
+                continue
+            if isinstance(result, DokkuError):
+                # most likely destroyed, have the next tick check the app list
+                logger.warning(f"Failed to refresh snapshot of {app_name}: {str(result)}")
+                self._list_due = 0.0
+                if app_name in self._stale_at:
+                    self._stale_at[app_name] = time.monotonic() + SNAPSHOT_VIEWED_TTL
+                continue
+            if isinstance(result, BaseException):
+                raise result
+            snapshots.append(result)
+
+        await self._save(snapshots)
+        if unavailable is not None:
+            raise unavailable
+
+    async def _fetch_app(self, app_name: str) -> AppSnapshot:
+        reports = await asyncio.gather(*[single_read(app_name, fresh=True) for single_read, _ in REPORTS.values()])
+        return self._snapshot(app_name, dict(zip(REPORTS, reports)))
+
+    async def _sweep(self):
+        """
+        Refresh every app with one fleet-wide call per report, also dropping apps that no longer exist.
+        """
+        started_at = time.perf_counter()
+        fleet_reports = dict(zip(REPORTS, await asyncio.gather(*[fleet_read(fresh=True) for _, fleet_read in REPORTS.values()])))
+        app_names = [app_name for app_name in fleet_reports["app_report"] if app_name]  # skip output without an app header
+
+        await self._forget([app_name for app_name in self._stale_at if app_name not in fleet_reports["app_report"]])
+        await self._save([self._snapshot(app_name, {column: reports.get(app_name) for column, reports in fleet_reports.items()}) for app_name in app_names])
+        logger.info(f"Swept snapshots of {len(app_names)} apps in {time.perf_counter() - started_at:.2f}s")
+
+    def _snapshot(self, app_name: str, reports: dict) -> AppSnapshot:
+        """
+        Build an app's snapshot and schedule its next refresh.
+
+        Reports are read with fresh set, so refreshed_at is when they were read rather than when a cached copy was.
+        """
+        ttl = SNAPSHOT_VIEWED_TTL if app_name in self._viewed else SNAPSHOT_TTL
+        self._stale_at[app_name] = time.monotonic() + ttl
+        refreshed_at = datetime.utcnow()
+        return AppSnapshot(app_name=app_name, **jsonable_encoder(reports), refreshed_at=refreshed_at, stale_after=refreshed_at + timedelta(seconds=ttl))
+
+    async def _save(self, snapshots: list):
+        if not snapshots:
+            return
+        async with create_session() as db:
+            await db_utils.save_app_snapshots(db, snapshots)
+
+        for snapshot in snapshots:
+            if snapshot.app_name not in self._snapshots:
+                self._app_names = None
+            self._snapshots[snapshot.app_name] = snapshot
+
+    async def _forget(self, app_names: list):
+        if not app_names:
+            return
+        logger.info(f"Removing snapshots of destroyed apps: {', '.join(app_names)}")
+        async with create_session() as db:
+            await db_utils.delete_app_snapshots(db, app_names)
+
+        for app_name in app_names:
+            self._snapshots.pop(app_name, None)
+            self._stale_at.pop(app_name, None)
+            self._viewed.pop(app_name, None)
+        self._app_names = None
+
+
+refresher = SnapshotRefresher()
+
+
+# ======================================================= Reads
+async def read_app_names(response: Response, fresh: bool = False) -> list:
+    """
+    List app names from the snapshot, or live when fresh is set or nothing has been snapshotted yet.
+    """
+    if not fresh:
+        app_names = refresher.app_names()
+        if app_names:
+            _set_stale_after(response, refresher.list_stale_after or datetime.utcnow())
+            return app_names
+
+    app_names = await dokku_commands.list_apps(fresh=True)  # skip the command cache too, so the header below holds
+    _set_stale_after(response, datetime.utcnow())  # read live, only as fresh as this moment
+    return app_names
+
+
+async def read_report(app_name: str, column: str, response: Response, fresh: bool = False):
+    """
+    Read one of an app's reports from its snapshot, or live when fresh is set or the app hasn't been snapshotted yet.
+
+    Live reads skip the command cache as well, whose entries may be older than the snapshot, and queue a refresh
+    of the app's snapshot so it catches up with what the client was just shown.
+    """
+    refresher.mark_viewed(app_name)
+    if not fresh:
+        snapshot = refresher.get(app_name)
+        report = getattr(snapshot, column) if snapshot is not None else None
+        if report is not None:
+            _set_stale_after(response, snapshot.stale_after)
+            if column == "ps_report":
+                return dokku_parser.with_process_list(dict(report))  # fleet sweeps leave the process list to be built when served
+            return report
+
+    single_read, _ = REPORTS[column]
+    report = await single_read(app_name, fresh=True)
+    refresher.mark_dirty(app_name)
+    _set_stale_after(response, datetime.utcnow())
+    return report
+
+
+def _set_stale_after(response: Response, stale_after: datetime):
+    response.headers[STALE_AFTER_HEADER] = stale_after.replace(tzinfo=timezone.utc).isoformat()
@@ -0,0 +1,46 @@
+import json
+
+from fastapi.responses import StreamingResponse
+
+# Headers that keep proxies (e.g. the nginx in front of dokku apps) from buffering streamed responses
+STREAMING_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
+# ======================================================= Server-sent events
+def format_sse(data: dict, event: str = None) -> str:
+    """
+    Format a payload as a server-sent event message.
+    """
+    message = f"event: {event}\n" if event else ""
+    return f"{message}data: {json.dumps(data)}\n\n"
+
+
+async def to_sse(events):
+    """
+    Transform an async iterator of event dicts (with an "event" key) into server-sent event messages.
+    """
+    async for event in events:
+        yield format_sse(event, event.get("event"))
+
+
+def sse_response(events) -> StreamingResponse:
+    """
+    Stream an async iterator of event dicts to the client as server-sent events.
+    """
+    return StreamingResponse(to_sse(events), media_type="text/event-stream", headers=STREAMING_HEADERS)
+
+
+# ======================================================= NDJSON
+async def to_ndjson(items):
+    """
+    Transform an async iterator of dicts into newline-delimited JSON lines.
+    """
+    async for item in items:
+        yield json.dumps(item) + "\n"
+
+
+def ndjson_response(items) -> StreamingResponse:
+    """
+    Stream an async iterator of dicts to the client as newline-delimited JSON, one line per item.
+    """
+    return StreamingResponse(to_ndjson(items), media_type="application/x-ndjson", headers=STREAMING_HEADERS)
@@ -0,0 +1,81 @@
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+# ======================================================= Config
+# Server-Timing phases in header order, with the description shown next to each in browser dev tools
+PHASES = {
+    "dokku": "dokku daemon",
+    "parse": "output parsing",
+    "db": "sqlite",
+    "github": "github api",
+}
+
+# Per-request phase totals, phase -> [seconds, count]. Tasks started during a request inherit the same dict.
+_request_timings: ContextVar[Optional[Dict[str, list]]] = ContextVar("request_timings", default=None)
+
+
+# ======================================================= Recording
+def record(phase: str, seconds: float):
+    """
+    Add time spent in a phase to the current request's Server-Timing, if there is one.
+    """
+    timings = _request_timings.get()
+    if timings is None:
+        return
+
+    entry = timings.get(phase)
+    if entry is None:
+        timings[phase] = [seconds, 1]
+    else:
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def server_timing_header(timings: Dict[str, list], total: float) -> str:
+    """
+    Format phase totals as a Server-Timing header value, e.g. 'dokku;dur=12.1;desc="dokku daemon (2)", total;dur=14.9'.
+    """
+    metrics: List[str] = []
+    for phase, description in PHASES.items():
+        entry = timings.get(phase)
+        if entry is not None:
+            metrics.append(f'{phase};dur={entry[0] * 1000:.1f};desc="{description} ({entry[1]})"')
+    metrics.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(metrics)
+
+
+# ======================================================= Middleware
+class ServerTimingMiddleware:
+    """
+    ASGI middleware adding a Server-Timing header that breaks each response's time down by phase.
+
+    Written as plain ASGI rather than BaseHTTPMiddleware so the context variable set here is visible to the endpoint.
+    Streaming responses send their headers first, so they only carry the phases completed before the first byte.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = {}
+        token = _request_timings.set(timings)
+        started_at = time.perf_counter()
+
+        async def send_with_timing(message):
+            if message["type"] == "http.response.start":
+                header = server_timing_header(timings, time.perf_counter() - started_at)
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", header.encode("latin-1")),
+                    (b"timing-allow-origin", b"*"),  # lets the dashboard, served from another origin, see the timings
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _request_timings.reset(token)
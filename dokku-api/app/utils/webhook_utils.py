@@ -0,0 +1,119 @@
+import asyncio
+import logging
+import os
+from collections import OrderedDict
+
+from database import create_session
+from dotenv import load_dotenv
+from sqlmodel.ext.asyncio.session import AsyncSession
+from utils import db_utils, job_utils
+
+# ======================================================= Config
+logger = logging.getLogger(__name__)
+
+load_dotenv()
+
+DEPLOY_QUIET_WINDOW = float(os.getenv("DEPLOY_QUIET_WINDOW", "10"))  # seconds without pushes before an app is deployed
+WEBHOOK_DELIVERY_LOG_SIZE = int(os.getenv("WEBHOOK_DELIVERY_LOG_SIZE", "1000"))  # recent delivery ids remembered for de-duplication
+
+
+# ======================================================= Deliveries
+class DeliveryLog:
+    """
+    Bounded LRU of recently processed X-GitHub-Delivery ids.
+
+    GitHub redelivers a webhook with the same delivery id when it retries, so a repeat can be acknowledged without doing the work twice.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._delivery_ids = OrderedDict()
+
+    def seen(self, delivery_id: str) -> bool:
+        """
+        Record a delivery id, returning True if it had already been recorded.
+        """
+        if delivery_id in self._delivery_ids:
+            self._delivery_ids.move_to_end(delivery_id)
+            return True
+
+        self._delivery_ids[delivery_id] = None
+        while len(self._delivery_ids) > self.max_size:
+            self._delivery_ids.popitem(last=False)
+        return False
+
+
+delivery_log = DeliveryLog(WEBHOOK_DELIVERY_LOG_SIZE)
+
+
+# ======================================================= Push-to-deploy
+class DeployDebouncer:
+    """
+    Debounces push-triggered deploys per app.
+
+    Every push restarts the app's quiet window; once it elapses only the newest commit is deployed.
+    If the app is already building, the deploy waits in the queue and later pushes update that queued
+    job rather than adding more, so a burst during a build collapses into one follow-up build.
+    """
+
+    def __init__(self, quiet_window: float):
+        self.quiet_window = quiet_window
+        self._latest_refs = {}  # app name -> newest pushed commit
+        self._timers = {}  # app name -> pending deploy task
+
+    def push(self, app_name: str, git_ref: str):
+        self._latest_refs[app_name] = git_ref
+
+        timer = self._timers.pop(app_name, None)
+        if timer is not None:
+            timer.cancel()
+        self._timers[app_name] = asyncio.ensure_future(self._deploy_when_quiet(app_name))
+
+    async def _deploy_when_quiet(self, app_name: str):
+        await asyncio.sleep(self.quiet_window)
+
+        self._timers.pop(app_name, None)
+        git_ref = self._latest_refs.pop(app_name)
+
+        try:
+            async with create_session() as db:
+                await job_utils.enqueue_or_update_job(db, "deploy", app_name, git_ref=git_ref)
+        except Exception as e:
+            logger.error(f"Failed to queue deploy for app: {app_name}: {str(e)}")
+
+
+deploy_debouncer = DeployDebouncer(DEPLOY_QUIET_WINDOW)
+
+
+# ======================================================= Events
+async def process_event(event_type: str, payload: dict):
+    """
+    Process a verified webhook event. Runs after the webhook has been acknowledged, so errors are only logged.
+    """
+    try:
+        async with create_session() as db:
+            if event_type == "push":
+                await handle_push_event(db, payload)
+    except Exception as e:
+        logger.error(f"Failed to process GitHub {event_type} event: {str(e)}")
+
+
+async def handle_push_event(db: AsyncSession, payload: dict):
+    """
+    Handle push events from GitHub by scheduling a deploy of every auto-deploying app tracking the pushed branch.
+    """
+    ref = payload.get("ref", "")
+    if not ref.startswith("refs/heads/") or payload.get("deleted"):
+        logger.info(f"Ignoring push to ref: {ref}")
+        return []
+
+    branch = ref[len("refs/heads/") :]
+    repo_id = str(payload["repository"]["id"])
+    git_ref = payload["after"]
+
+    deployment_configs = await db_utils.get_auto_deploy_configs_for_branch(db, repo_id, branch)
+    for deployment_config in deployment_configs:
+        logger.info(f"Scheduling deploy of {git_ref} to app: {deployment_config.dokku_app_name}")
+        deploy_debouncer.push(deployment_config.dokku_app_name, git_ref)
+
+    return [deployment_config.dokku_app_name for deployment_config in deployment_configs]
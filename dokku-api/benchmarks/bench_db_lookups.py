@@ -0,0 +1,120 @@
+"""
+Benchmark the hot deployment config / GitHub credential lookups at 10k rows, with and without the lookup indexes.
+
+Usage (from dokku-api/):
+    python benchmarks/bench_db_lookups.py [--rows 10000] [--lookups 2000]
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+
+# run against a throwaway database, must be set before the app modules are imported
+DATABASE_PATH = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ["DATABASE_URL"] = f"sqlite:///{DATABASE_PATH}"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from database import async_engine, create_session, engine, initialize_database  # noqa: E402
+from models import DeploymentConfig, GitHubAppCredentials  # noqa: E402
+from sqlalchemy import text  # noqa: E402
+from sqlmodel import Session  # noqa: E402
+from utils import db_utils  # noqa: E402
+
+INDEXES = ["ix_deployment_configs_dokku_app_name", "ix_github_app_credentials_app_id", "ix_deployment_configs_repo_branch"]
+
+
+def seed(rows: int):
+    with Session(engine) as db:
+        for i in range(rows):
+            db.add(
+                DeploymentConfig(
+                    github_repo_id=str(i),
+                    github_repo_name=f"repo-{i}",
+                    github_repo_url=f"https://github.com/owner/repo-{i}.git",
+                    github_app_id=str(i % 10),
+                    github_app_installation_id=str(i % 100),
+                    github_default_branch="main",
+                    dokku_app_name=f"app-{i}",
+                )
+            )
+            db.add(
+                GitHubAppCredentials(
+                    app_id=str(i),
+                    app_name=f"github-app-{i}",
+                    client_id="client",
+                    client_secret_encrypted="secret",
+                    private_key_encrypted="key",
+                    webhook_secret_encrypted="webhook",
+                )
+            )
+        db.commit()
+
+
+async def time_lookups(rows: int, lookups: int) -> dict:
+    keys = [str(random.randrange(rows)) for _ in range(lookups)]
+    timings = {}
+
+    async with create_session() as db:
+        started = time.perf_counter()
+        for key in keys:
+            await db_utils.get_deployment_config_by_app_name(db, f"app-{key}")
+        timings["deployment config by app name"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for key in keys:
+            await db_utils.get_github_app_credentials_by_app_id(db, key)
+        timings["credentials by app id"] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        for key in keys:
+            await db_utils.get_auto_deploy_configs_for_branch(db, key, "main")
+        timings["deploy configs by repo and branch"] = time.perf_counter() - started
+
+    return {name: elapsed / lookups * 1e6 for name, elapsed in timings.items()}  # microseconds per lookup
+
+
+def query_plan(sql: str) -> str:
+    with engine.connect() as connection:
+        return " / ".join(row[-1] for row in connection.execute(text(f"EXPLAIN QUERY PLAN {sql}")))
+
+
+async def run(rows: int, lookups: int, lookup_sql: str):
+    try:
+        return await time_lookups(rows, lookups), query_plan(lookup_sql)
+    finally:
+        await async_engine.dispose()  # connections are bound to this event loop
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10_000)
+    parser.add_argument("--lookups", type=int, default=2_000)
+    args = parser.parse_args()
+
+    initialize_database()
+    seed(args.rows)
+    lookup_sql = "SELECT * FROM deployment_configs WHERE dokku_app_name = 'app-1'"
+
+    indexed, indexed_plan = asyncio.run(run(args.rows, args.lookups, lookup_sql))
+
+    with engine.begin() as connection:
+        for index in INDEXES:
+            connection.execute(text(f"DROP INDEX {index}"))
+    engine.dispose()  # pooled connections hold prepared statements planned against the old schema
+
+    unindexed, unindexed_plan = asyncio.run(run(args.rows, args.lookups, lookup_sql))
+
+    print(f"{args.rows} rows, {args.lookups} lookups each (us per lookup)\n")
+    print(f"{'lookup':<36}{'indexed':>12}{'no index':>12}{'speedup':>10}")
+    for name in indexed:
+        print(f"{name:<36}{indexed[name]:>12.1f}{unindexed[name]:>12.1f}{unindexed[name] / indexed[name]:>9.1f}x")
+    print(f"\nplan with index:    {indexed_plan}")
+    print(f"plan without index: {unindexed_plan}")
+
+
+if __name__ == "__main__":
+    main()
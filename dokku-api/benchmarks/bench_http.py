@@ -0,0 +1,269 @@
+"""
+Load test the API against the fake dokku daemon at a fixed concurrency, reporting p50/p95/p99 latency and req/s.
+
+By default the app is driven in-process through httpx's ASGI transport, so no server is needed and the numbers
+measure the API itself. Pass --url to load test a running server instead (the webhook scenario then needs
+--webhook-app-id and --webhook-secret of a GitHub App saved on that server).
+
+Usage (from dokku-api/):
+    python benchmarks/bench_http.py [--requests 2000] [--concurrency 32] [--latency 20] [--jitter 10]
+    python benchmarks/bench_http.py --compare benchmarks/baseline.json   # exit 1 on regressions
+    python benchmarks/bench_http.py --save benchmarks/baseline.json      # record a new baseline
+"""
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+
+import httpx
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+APP_DIR = os.path.join(BENCHMARKS_DIR, "..", "app")
+
+WEBHOOK_APP_ID = "1000"
+WEBHOOK_SECRET = "benchmark-webhook-secret"
+WEBHOOK_REPO_ID = "2000"
+
+
+# ======================================================= Scenarios
+def build_scenarios(app_names: list, webhook_app_id: str, webhook_secret: str) -> list:
+    """
+    Build the (name, request factory) pairs to run. Each factory returns the kwargs for one httpx request.
+    """
+    counter = iter(range(10**9))
+
+    def app_report():
+        return {"method": "GET", "url": f"/apps/{app_names[next(counter) % len(app_names)]}"}
+
+    def webhook():
+        body = json.dumps({"ref": "refs/heads/main", "after": uuid.uuid4().hex, "repository": {"id": int(WEBHOOK_REPO_ID)}}).encode()
+        signature = "sha256=" + hmac.new(webhook_secret.encode(), body, hashlib.sha256).hexdigest()
+        headers = {
+            "Content-Type": "application/json",
+            "X-GitHub-Event": "push",
+            "X-GitHub-Delivery": str(uuid.uuid4()),
+            "X-GitHub-Hook-Installation-Target-ID": webhook_app_id,
+            "X-Hub-Signature-256": signature,
+        }
+        return {"method": "POST", "url": "/github/webhook", "content": body, "headers": headers}
+
+    scenarios = [
+        ("GET /apps", lambda: {"method": "GET", "url": "/apps"}),
+        ("GET /apps/{name}", app_report),
+        ("GET /health", lambda: {"method": "GET", "url": "/health"}),
+        ("GET /health/ready", lambda: {"method": "GET", "url": "/health/ready"}),
+    ]
+    if webhook_app_id and webhook_secret:
+        scenarios.append(("POST /github/webhook (burst)", webhook))
+    return scenarios
+
+
+async def run_scenario(client: httpx.AsyncClient, make_request, requests: int, concurrency: int) -> dict:
+    """
+    Send requests from concurrency workers until the total is reached, returning latency percentiles and throughput.
+    """
+    latencies = []
+    statuses = Counter()
+    remaining = iter(range(requests))
+
+    async def worker():
+        for _ in remaining:
+            started = time.perf_counter()
+            try:
+                response = await client.request(**make_request())
+                statuses[response.status_code] += 1
+            except httpx.HTTPError as e:
+                statuses[type(e).__name__] += 1
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "p50_ms": round(_percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(_percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(_percentile(latencies, 99) * 1000, 2),
+        "rps": round(len(latencies) / elapsed, 1),
+        "errors": sum(count for status, count in statuses.items() if not (isinstance(status, int) and status < 400)),
+    }
+
+
+def _percentile(sorted_values: list, percentile: float) -> float:
+    """
+    Nearest-rank percentile of an already sorted list.
+    """
+    if not sorted_values:
+        return 0.0
+    return sorted_values[max(0, math.ceil(percentile / 100 * len(sorted_values)) - 1)]
+
+
+# ======================================================= Targets
+async def run_in_process(args) -> dict:
+    """
+    Start the fake daemon, then run every scenario against the app in this process.
+    """
+    work_dir = tempfile.mkdtemp()
+    socket_path = os.path.join(work_dir, "dokku-daemon.sock")
+    daemon = subprocess.Popen(
+        [
+            sys.executable,
+            os.path.join(BENCHMARKS_DIR, "fake_daemon.py"),
+            f"--socket={socket_path}",
+            f"--apps={args.apps}",
+            f"--latency={args.latency}",
+            f"--jitter={args.jitter}",
+            f"--failure-rate={args.failure_rate}",
+        ],
+        stdout=subprocess.DEVNULL,
+    )
+
+    try:
+        for _ in range(100):
+            if os.path.exists(socket_path):
+                break
+            await asyncio.sleep(0.05)
+
+        # configure the app before importing it, deploys are pushed far out so bursts only exercise the webhook path
+        os.environ.update(
+            {
+                "DOKKU_SOCKET_PATH": socket_path,
+                "DATABASE_URL": f"sqlite:///{os.path.join(work_dir, 'bench.db')}",
+                "DEPLOY_QUIET_WINDOW": "3600",
+                "LOG_LEVEL": os.getenv("LOG_LEVEL", "WARNING"),
+            }
+        )
+        sys.path.insert(0, APP_DIR)
+        import main
+
+        async with main.lifespan(main.app):
+            await _seed_webhook_app()
+            transport = httpx.ASGITransport(app=main.app)
+            async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+                app_names = [f"app-{i}" for i in range(args.apps)]
+                return await run_scenarios(client, build_scenarios(app_names, WEBHOOK_APP_ID, WEBHOOK_SECRET), args)
+    finally:
+        daemon.terminate()
+        daemon.wait()
+
+
+async def run_against_url(args) -> dict:
+    """
+    Run every scenario against an already running server.
+    """
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60.0) as client:
+        app_names = (await client.get("/apps")).json()
+        return await run_scenarios(client, build_scenarios(app_names, args.webhook_app_id, args.webhook_secret), args)
+
+
+async def run_scenarios(client: httpx.AsyncClient, scenarios: list, args) -> dict:
+    results = {}
+    for name, make_request in scenarios:
+        await run_scenario(client, make_request, args.warmup, args.concurrency)  # warm up pools and caches
+        results[name] = await run_scenario(client, make_request, args.requests, args.concurrency)
+    return results
+
+
+async def _seed_webhook_app():
+    """
+    Save a GitHub App and an auto-deploying config for its repository, so webhooks are verified and matched.
+    """
+    from database import create_session
+    from models import DeploymentConfigCreate
+    from utils import db_utils, github_utils
+
+    app_data = {"id": WEBHOOK_APP_ID, "name": "bench", "client_id": "bench", "client_secret": "bench", "pem": "bench", "webhook_secret": WEBHOOK_SECRET}
+    deployment_config = DeploymentConfigCreate(
+        dokku_app_name="app-0",
+        github_repo_id=WEBHOOK_REPO_ID,
+        github_repo_name="bench",
+        github_repo_url="https://github.com/bench/bench.git",
+        github_default_branch="main",
+        github_app_id=WEBHOOK_APP_ID,
+        github_app_installation_id="1",
+    )
+    async with create_session() as db:
+        await github_utils.save_github_app_credentials(db, app_data)
+        await db_utils.create_deployment_config(db, deployment_config)
+
+
+# ======================================================= Reporting
+def print_results(results: dict, baseline: dict = None):
+    print(f"{'scenario':<32}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}{'errors':>8}")
+    for name, result in results.items():
+        line = f"{name:<32}{result['p50_ms']:>10.2f}{result['p95_ms']:>10.2f}{result['p99_ms']:>10.2f}{result['rps']:>10.1f}{result['errors']:>8}"
+        if baseline and name in baseline:
+            line += f"   (baseline p95 {baseline[name]['p95_ms']:.2f}, {baseline[name]['rps']:.1f} req/s)"
+        print(line)
+
+
+def find_regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    """
+    List the scenarios whose p95 latency rose, or throughput fell, by more than tolerance against the baseline.
+    """
+    regressions = []
+    for name, result in results.items():
+        expected = baseline.get(name)
+        if expected is None:
+            continue
+        if result["p95_ms"] > expected["p95_ms"] * (1 + tolerance):
+            regressions.append(f"{name}: p95 {result['p95_ms']:.2f} ms vs baseline {expected['p95_ms']:.2f} ms")
+        if result["rps"] < expected["rps"] * (1 - tolerance):
+            regressions.append(f"{name}: {result['rps']:.1f} req/s vs baseline {expected['rps']:.1f} req/s")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=32, help="requests in flight at once")
+    parser.add_argument("--warmup", type=int, default=200, help="untimed requests per scenario before measuring")
+    parser.add_argument("--apps", type=int, default=50, help="number of apps on the fake daemon")
+    parser.add_argument("--latency", type=float, default=20.0, help="fake daemon mean latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=10.0, help="fake daemon latency jitter in milliseconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of fake daemon commands that fail")
+    parser.add_argument("--url", help="load test a running server instead of the app in-process")
+    parser.add_argument("--webhook-app-id", help="GitHub App id for the webhook scenario with --url")
+    parser.add_argument("--webhook-secret", help="GitHub App webhook secret for the webhook scenario with --url")
+    parser.add_argument("--compare", metavar="BASELINE", help="compare against a baseline file, exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p95 / req/s change against the baseline")
+    parser.add_argument("--save", metavar="BASELINE", help="write the results to a baseline file")
+    args = parser.parse_args()
+
+    results = asyncio.run(run_against_url(args) if args.url else run_in_process(args))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)["results"]
+
+    print(f"{args.requests} requests per scenario, concurrency {args.concurrency}, daemon latency {args.latency}±{args.jitter} ms\n")
+    print_results(results, baseline)
+
+    if args.save:
+        settings = {key: getattr(args, key) for key in ("requests", "concurrency", "apps", "latency", "jitter", "failure_rate")}
+        with open(args.save, "w") as f:
+            json.dump({"settings": settings, "results": results}, f, indent=2)
+            f.write("\n")
+
+    if baseline:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Benchmark reading large daemon responses (e.g. `logs --num 100000`), timing them and measuring peak memory.
+
+Serves colourised log output of increasing size from an in-process unix socket and reads it with the pooled
+connection's chunked reader, against the previous readline / decode / strip / loads pipeline kept here as a baseline.
+The previous reader only worked below the 64 KiB StreamReader limit, so it is given an unlimited reader here.
+
+Usage (from dokku-api/):
+    python benchmarks/bench_large_output.py [--sizes 0.05,1,8,32] [--repeat 3]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from dokku import dokku_client  # noqa: E402
+
+LOG_LINE = "2026-10-18T09:12:14.882014+00:00 \x1b[36mapp-0 web.1\x1b[0m  GET /static/app.js \x1b[32m200\x1b[0m 1.904 ms - 48211"
+
+
+# ======================================================= Daemon
+def response_of_size(megabytes: float) -> bytes:
+    """
+    A daemon response line whose output is colourised log lines, with raw escape codes like the daemon sends.
+    """
+    lines = int(megabytes * 1024 * 1024 / (len(LOG_LINE) + 1)) or 1
+    body = json.dumps({"ok": True, "output": "\n".join([LOG_LINE] * lines)}, ensure_ascii=False)
+    return body.replace("\\u001b", "\x1b").encode("utf-8") + b"\n"
+
+
+async def serve(socket_path: str, response: bytes):
+    async def handle(reader, writer):
+        while await reader.readline():
+            writer.write(response)
+            await writer.drain()
+        writer.close()
+
+    return await asyncio.start_unix_server(handle, socket_path)
+
+
+# ======================================================= Readers
+async def legacy_read(socket_path: str) -> dict:
+    reader, writer = await asyncio.open_unix_connection(socket_path, limit=2**31)
+    writer.write(b"logs\n")
+    await writer.drain()
+    raw_data = await reader.readline()
+    writer.close()
+    response_str = raw_data.decode("utf-8").strip()
+    response_str = re.compile(r"\x1B[@-_][0-?]*[ -/]*[@-~]").sub("", response_str)
+    return json.loads(response_str)
+
+
+async def current_read(socket_path: str) -> dict:
+    conn = dokku_client.DokkuConnection(socket_path)
+    await conn.connect()
+    conn.writer.write(b"logs\n")
+    await conn.writer.drain()
+    raw_data = await conn.read_response(max_bytes=2**31)
+    await conn.close()
+    return dokku_client.parse_dokku_response(raw_data)
+
+
+async def measure(read, socket_path: str, repeat: int) -> tuple:
+    """
+    Best time in milliseconds over repeat reads, then the peak traced memory of one more in MiB.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        started_at = time.perf_counter()
+        await read(socket_path)
+        best = min(best, time.perf_counter() - started_at)
+
+    tracemalloc.start()
+    result = await read(socket_path)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    assert "\x1b" not in result["output"]
+    return best * 1000, peak / 1024 / 1024
+
+
+async def run(sizes: list, repeat: int):
+    print(f"best of {repeat}, peak memory traced while reading one response\n")
+    print(f"{'output MiB':>10}{'previous ms':>14}{'previous MiB':>14}{'current ms':>12}{'current MiB':>13}")
+    for megabytes in sizes:
+        response = response_of_size(megabytes)
+        socket_path = os.path.join(tempfile.mkdtemp(), "daemon.sock")
+        server = await serve(socket_path, response)
+        async with server:
+            previous_ms, previous_mib = await measure(legacy_read, socket_path, repeat)
+            current_ms, current_mib = await measure(current_read, socket_path, repeat)
+        print(f"{len(response) / 1024 / 1024:>10.2f}{previous_ms:>14.1f}{previous_mib:>14.1f}{current_ms:>12.1f}{current_mib:>13.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="0.05,1,8,32", help="comma separated response sizes in MiB")
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run([float(size) for size in args.sizes.split(",")], args.repeat))
+
+
+if __name__ == "__main__":
+    main()
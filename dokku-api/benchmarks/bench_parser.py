@@ -0,0 +1,132 @@
+"""
+Microbenchmark the dokku output parsers over large outputs shaped like those the daemon returns for a big host.
+
+Compares the current parsers against the previous naive implementations, kept here as a baseline.
+
+Usage (from dokku-api/):
+    python benchmarks/bench_parser.py [--apps 1000] [--repeat 5]
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+
+from dokku import dokku_client, dokku_parser  # noqa: E402
+
+APP_REPORT_FIELDS = [
+    ("App created at", "1712345678"),
+    ("App deploy source", "git"),
+    ("App deploy source metadata", "a1b2c3d4e5f6"),
+    ("App dir", "/home/dokku/{app}"),
+    ("App locked", "false"),
+]
+PS_REPORT_FIELDS = [
+    ("Deployed", "true"),
+    ("Processes", "4"),
+    ("Ps can scale", "true"),
+    ("Ps computed procfile path", "Procfile"),
+    ("Ps global procfile path", "Procfile"),
+    ("Ps procfile path", ""),
+    ("Ps restart policy", "on-failure:10"),
+    ("Restore", "true"),
+    ("Running", "true"),
+]
+
+
+# ======================================================= Recorded output shapes
+def report_output(apps: int, kind: str, fields: list, processes: int = 0) -> str:
+    lines = []
+    for i in range(apps):
+        app = f"app-{i}"
+        lines.append(f"=====> {app} {kind} information")
+        lines.extend(f"       {label + ':':<31}{value.format(app=app)}" for label, value in fields)
+        for process_type in ("web", "worker")[: min(processes, 2)]:
+            for index in range(1, processes // 2 + 1):
+                lines.append(f"       {f'Status {process_type} {index}:':<31}running (CID: {i:011x})")
+    return "\n".join(lines)
+
+
+def plugin_list_output(plugins: int) -> str:
+    return "\n".join(f"  {f'{i:02d}_plugin-{i}':<22}0.35.{i % 10} {'enabled' if i % 7 else 'disabled':<10}dokku plugin number {i}" for i in range(plugins))
+
+
+def apps_list_output(apps: int) -> str:
+    return "=====> My Apps\n" + "\n".join(f"app-{i}" for i in range(apps))
+
+
+# ======================================================= Previous implementations
+def legacy_parse_apps_list(dokku_output):
+    lines = dokku_output.strip().split("\n")
+    return [app.strip() for app in lines[1:] if app.strip()]
+
+
+def legacy_parse_reports(dokku_output):
+    reports = {}
+    report = None
+    for line in dokku_output.strip().split("\n"):
+        if line.startswith("=====>"):
+            report = reports.setdefault(line[len("=====>") :].split()[0], {})
+            continue
+        if report is None or ":" not in line:
+            continue
+        key, value = line.split(":", 1)
+        report[key.strip().lower().replace(" ", "_")] = value.strip()
+    return reports
+
+
+def legacy_parse_dokku_response(raw_data: bytes) -> dict:
+    response_str = raw_data.decode("utf-8").strip()
+    ansi_escape = re.compile(r"\x1B[@-_][0-?]*[ -/]*[@-~]")
+    return json.loads(ansi_escape.sub("", response_str))
+
+
+def current_parse_dokku_response(raw_data: bytes) -> dict:
+    # ANSI codes are now stripped while reading, so include that pass to compare like for like
+    return dokku_client.parse_dokku_response(dokku_client.strip_ansi(raw_data)[0])
+
+
+# ======================================================= Runner
+def best_of(func, arg, repeat: int) -> float:
+    timer = timeit.Timer(lambda: func(arg))
+    number, _ = timer.autorange()
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1000  # milliseconds per call
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    apps_report = report_output(args.apps, "app", APP_REPORT_FIELDS)
+    ps_report = report_output(args.apps, "ps", PS_REPORT_FIELDS, processes=4)
+    ps_report_one = report_output(1, "ps", PS_REPORT_FIELDS, processes=4)
+    plugin_list = plugin_list_output(200)
+    apps_list = apps_list_output(args.apps * 5)
+    small_response = json.dumps({"ok": True, "output": report_output(1, "ps", PS_REPORT_FIELDS, processes=2)}).encode()
+    large_response = json.dumps({"ok": True, "output": ps_report}).encode()
+
+    cases = [
+        ("apps:list", len(apps_list), legacy_parse_apps_list, dokku_parser.parse_apps_list, apps_list),
+        ("apps:report (all apps)", len(apps_report), legacy_parse_reports, dokku_parser.parse_reports, apps_report),
+        ("ps:report (all apps)", len(ps_report), legacy_parse_reports, dokku_parser.parse_reports, ps_report),
+        ("ps:report (1 app) + process list", len(ps_report_one), legacy_parse_reports, dokku_parser.parse_process_report, ps_report_one),
+        ("plugin:list", len(plugin_list), None, dokku_parser.parse_plugin_list, plugin_list),
+        ("daemon response (1 app)", len(small_response), legacy_parse_dokku_response, current_parse_dokku_response, small_response),
+        ("daemon response (all apps)", len(large_response), legacy_parse_dokku_response, current_parse_dokku_response, large_response),
+    ]
+
+    print(f"{args.apps} apps, best of {args.repeat} (ms per call)\n")
+    print(f"{'output':<34}{'bytes':>10}{'previous':>12}{'current':>12}")
+    for name, size, legacy, current, data in cases:
+        previous = f"{best_of(legacy, data, args.repeat):.3f}" if legacy else "-"
+        print(f"{name:<34}{size:>10}{previous:>12}{best_of(current, data, args.repeat):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
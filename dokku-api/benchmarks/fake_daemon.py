@@ -0,0 +1,117 @@
+"""
+Local stand-in for dokku-daemon, for load testing the API without a Dokku host.
+
+Listens on a unix socket and speaks the daemon's protocol: one command per line in, one JSON line
+({"ok": ..., "output": ...}) out per command. Report, list and log commands replay the outputs in
+benchmarks/recordings/ for a fleet of fake apps, anything else succeeds with a short message.
+
+Usage (from dokku-api/):
+    python benchmarks/fake_daemon.py --socket /tmp/dokku-daemon.sock [--apps 50] [--latency 20] [--jitter 10] [--failure-rate 0.01]
+
+Then point the API at it with DOKKU_SOCKET_PATH=/tmp/dokku-daemon.sock.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+
+RECORDINGS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "recordings")
+
+# command verb -> recording, "{app}" in a recording is replaced with the app name
+RECORDINGS = {
+    "apps:report": "apps_report.txt",
+    "ps:report": "ps_report.txt",
+    "domains:report": "domains_report.txt",
+    "plugin:list": "plugin_list.txt",
+    "logs": "logs.txt",
+}
+
+
+# ======================================================= Daemon
+class FakeDaemon:
+    def __init__(self, apps: int, latency: float, jitter: float, failure_rate: float):
+        self.app_names = [f"app-{i}" for i in range(apps)]
+        self.latency = latency
+        self.jitter = jitter
+        self.failure_rate = failure_rate
+        self.recordings = {verb: _read_recording(file_name) for verb, file_name in RECORDINGS.items()}
+        self.apps_list_header = _read_recording("apps_list.txt")
+        self.commands = 0
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+
+                response = await self.handle_command(line.decode("utf-8").strip())
+                writer.write((json.dumps(response) + "\n").encode("utf-8"))
+                await writer.drain()
+        except ConnectionResetError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_command(self, command: str) -> dict:
+        """
+        Answer a command after the configured latency, failing a share of them at random.
+        """
+        self.commands += 1
+        await asyncio.sleep(max(0.0, self.latency + random.uniform(-self.jitter, self.jitter)))
+
+        if random.random() < self.failure_rate:
+            return {"ok": False, "output": f"Simulated failure running: {command}"}
+        return {"ok": True, "output": self.output_for(command)}
+
+    def output_for(self, command: str) -> str:
+        args = [arg for arg in command.split() if not arg.startswith("--")]
+        verb = args[0] if args else ""
+
+        if verb == "apps:list":
+            return self.apps_list_header + "\n".join(self.app_names)
+
+        recording = self.recordings.get(verb)
+        if recording is None:
+            return f"-----> {command}: done"
+
+        # report commands without an app report on every app
+        app_names = args[1:2] or (self.app_names if verb.endswith(":report") else [])
+        return "".join(recording.replace("{app}", app_name) for app_name in app_names) or recording
+
+
+def _read_recording(file_name: str) -> str:
+    with open(os.path.join(RECORDINGS_DIR, file_name)) as f:
+        return f.read()
+
+
+async def serve(socket_path: str, daemon: FakeDaemon):
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+
+    server = await asyncio.start_unix_server(daemon.handle_connection, socket_path)
+    print(f"Fake dokku daemon listening on {socket_path} with {len(daemon.app_names)} apps", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--socket", default="/tmp/dokku-daemon.sock", help="unix socket path to listen on")
+    parser.add_argument("--apps", type=int, default=50, help="number of fake apps")
+    parser.add_argument("--latency", type=float, default=20.0, help="mean response latency in milliseconds")
+    parser.add_argument("--jitter", type=float, default=10.0, help="latency varies uniformly by up to this many milliseconds")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="share of commands answered with ok: false")
+    args = parser.parse_args()
+
+    daemon = FakeDaemon(args.apps, args.latency / 1000, args.jitter / 1000, args.failure_rate)
+    try:
+        asyncio.run(serve(args.socket, daemon))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Shared fixtures: the API modules are imported from app/ the way the server runs them, and commands go to an
+in-process benchmarks/fake_daemon.py instead of a Dokku host.
+
+Run from dokku-api/ with: python -m pytest -q
+"""
+
+import asyncio
+import os
+import shutil
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [os.path.join(ROOT, "app"), os.path.join(ROOT, "benchmarks")]
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{tempfile.mkdtemp()}/dokku-api.db")  # read when database.py is imported
+
+from dokku import dokku_client, dokku_commands  # noqa: E402
+from fake_daemon import FakeDaemon  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+async def fake_daemon(monkeypatch):
+    """
+    A fake daemon answering on a fresh socket after 200 ms, with a clean pool, cache and circuit breaker.
+
+    Tests can change its latency and failure_rate, drop connections with fake_daemon.connections, or stop it
+    with fake_daemon.server.close().
+    """
+    socket_dir = tempfile.mkdtemp()  # short, unix socket paths are limited to ~100 characters
+    socket_path = os.path.join(socket_dir, "dokku-daemon.sock")
+    daemon = FakeDaemon(apps=3, latency=0.2, jitter=0.0, failure_rate=0.0)
+    daemon.connections = []  # the daemon's end of each connection, for tests to drop
+
+    async def handle_connection(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        daemon.connections.append(writer)
+        await daemon.handle_connection(reader, writer)
+
+    daemon.server = await asyncio.start_unix_server(handle_connection, socket_path)
+
+    monkeypatch.setattr(dokku_client, "SOCKET_PATH", socket_path)
+    monkeypatch.setattr(dokku_client, "_pool", None)
+    monkeypatch.setattr(dokku_client, "breaker", dokku_client.CircuitBreaker(failure_threshold=3, backoff=0.2, max_backoff=1.0, jitter=0.0))
+    monkeypatch.setattr(dokku_commands, "_change_listeners", [])
+    dokku_commands.clear_cache()
+    dokku_commands._in_flight.clear()
+    try:
+        yield daemon
+    finally:
+        await dokku_client.close_pool()
+        daemon.server.close()
+        await daemon.server.wait_closed()
+        shutil.rmtree(socket_dir, ignore_errors=True)
+
+
+@pytest.fixture
+async def job_worker(monkeypatch):
+    """
+    A running job worker with two slots, on a throwaway database.
+    """
+    import database
+    from utils import job_utils
+
+    database.initialize_database()
+    worker = job_utils.JobWorker(concurrency=2)
+    monkeypatch.setattr(job_utils, "worker", worker)
+    await worker.start()
+    try:
+        yield worker
+    finally:
+        await worker.stop()
+        await database.dispose_engines()
@@ -0,0 +1,30 @@
+import asyncio
+
+import pytest
+from dokku import dokku_client
+from utils import batch_utils
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_abandoned_batch_finishes_running_writes_and_cancels_reads(fake_daemon, monkeypatch):
+    finished = []
+    execute = dokku_client.execute
+
+    async def execute_and_record(command, *args, **kwargs):
+        response = await execute(command, *args, **kwargs)
+        finished.append(command)
+        return response
+
+    monkeypatch.setattr(dokku_client, "execute", execute_and_record)
+
+    async def consume():
+        async for _ in batch_utils.run_batch(["ps:restart app-0", "apps:report app-0"], parallel=True):
+            pass
+
+    batch = asyncio.ensure_future(consume())
+    await asyncio.sleep(0.05)
+    batch.cancel()
+    await asyncio.sleep(0.3)
+
+    assert finished == ["ps:restart app-0"]
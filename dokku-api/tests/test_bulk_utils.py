@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+from utils import bulk_utils
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_abandoned_bulk_action_finishes_running_apps(fake_daemon, job_worker, monkeypatch):
+    finished = []
+    restart = bulk_utils.BULK_ACTIONS["restart"]
+
+    async def restart_and_record(app_name):
+        await restart(app_name)
+        finished.append(app_name)
+
+    monkeypatch.setitem(bulk_utils.BULK_ACTIONS, "restart", restart_and_record)
+
+    events = bulk_utils.run_bulk_action("restart", ["app-0", "app-1", "app-2"], parallelism=2)
+    async for event in events:
+        if event["event"] == "app_started" and event["app"] == "app-1":
+            break
+    await asyncio.sleep(0.05)
+    await events.aclose()
+    await asyncio.sleep(0.3)
+
+    assert sorted(finished) == ["app-0", "app-1"]
+
+
+async def test_bulk_action_waits_for_the_apps_job_slot(fake_daemon, job_worker, monkeypatch):
+    monkeypatch.setattr(bulk_utils, "BULK_HEARTBEAT_INTERVAL", 0.5)
+    release = asyncio.Event()
+
+    async def deploy():
+        async with job_worker.hold_app("app-0"):
+            await release.wait()
+
+    deploying = asyncio.ensure_future(deploy())
+    await asyncio.sleep(0)
+
+    finished, waited = [], False
+    try:
+        async for event in bulk_utils.run_bulk_action("restart", ["app-0", "app-1"], parallelism=2):
+            if event["event"] == "heartbeat":
+                waited = True
+                assert finished == ["app-1"]  # app-0 waits for its deploy to finish
+                assert fake_daemon.commands == 1
+                release.set()
+            if event["event"] == "app_done":
+                finished.append(event["app"])
+    finally:
+        release.set()
+        await deploying
+
+    assert waited
+    assert finished == ["app-1", "app-0"]
+
+
+async def test_unexpected_error_fails_only_that_app(fake_daemon, job_worker, monkeypatch):
+    async def broken_restart(app_name):
+        if app_name == "app-0":
+            raise RuntimeError("boom")
+
+    monkeypatch.setitem(bulk_utils.BULK_ACTIONS, "restart", broken_restart)
+
+    events = [event async for event in bulk_utils.run_bulk_action("restart", ["app-0", "app-1"], parallelism=2, max_failure_rate=1.0)]
+
+    results = {event["app"]: event for event in events if event["event"] == "app_done"}
+    assert results["app-0"]["success"] is False
+    assert results["app-0"]["error"] == "Unexpected error: boom"
+    assert results["app-1"]["success"] is True
+    assert events[-1]["event"] == "done"
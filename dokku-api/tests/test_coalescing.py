@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+from dokku import dokku_commands
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_concurrent_reads_share_one_daemon_call(fake_daemon):
+    results = await asyncio.gather(*(dokku_commands.list_apps(fresh=True) for _ in range(5)))
+
+    assert all(result == ["app-0", "app-1", "app-2"] for result in results)
+    assert fake_daemon.commands == 1
+    assert dokku_commands._in_flight == {}
+
+
+async def test_cancelled_caller_does_not_fail_the_others(fake_daemon):
+    first = asyncio.ensure_future(dokku_commands.list_apps(fresh=True))
+    second = asyncio.ensure_future(dokku_commands.list_apps(fresh=True))
+    await asyncio.sleep(0.05)
+
+    first.cancel()
+
+    assert await second == ["app-0", "app-1", "app-2"]
+    assert first.cancelled()
+    assert fake_daemon.commands == 1
+
+
+async def test_read_is_cancelled_once_every_caller_is(fake_daemon):
+    caller = asyncio.ensure_future(dokku_commands.list_apps(fresh=True))
+    await asyncio.sleep(0.05)
+    (task, _), = dokku_commands._in_flight.values()
+
+    caller.cancel()
+    await asyncio.sleep(0)
+
+    assert dokku_commands._in_flight == {}
+    await asyncio.wait({task}, timeout=1)
+    assert task.cancelled()
+
+
+async def test_join_after_last_caller_cancelled_starts_a_new_call(fake_daemon):
+    caller = asyncio.ensure_future(dokku_commands.list_apps(fresh=True))
+    await asyncio.sleep(0.05)
+
+    # the new caller runs right after the cancelled one gives up, before the daemon call has seen its cancellation
+    caller.cancel()
+    late_caller = asyncio.ensure_future(dokku_commands.list_apps(fresh=True))
+
+    assert await late_caller == ["app-0", "app-1", "app-2"]
+    assert caller.cancelled()
+    assert fake_daemon.commands == 2
+    assert dokku_commands._in_flight == {}
@@ -0,0 +1,45 @@
+import asyncio
+
+import pytest
+from utils import disconnect_utils
+
+pytestmark = pytest.mark.anyio
+
+
+async def run_until_disconnect(method: str) -> str:
+    """
+    Run a slow handler behind the middleware, disconnecting its client halfway. Returns how the handler ended.
+    """
+    outcome = "running"
+
+    async def app(scope, receive, send):
+        nonlocal outcome
+        try:
+            await asyncio.sleep(0.2)
+            outcome = "completed"
+        except asyncio.CancelledError:
+            outcome = "cancelled"
+            raise
+
+    disconnect = asyncio.Event()
+
+    async def receive():
+        await disconnect.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        pass
+
+    request = asyncio.ensure_future(disconnect_utils.CancelOnDisconnectMiddleware(app)({"type": "http", "method": method, "path": "/"}, receive, send))
+    await asyncio.sleep(0.05)
+    disconnect.set()
+    await request
+    return outcome
+
+
+async def test_reads_are_cancelled_when_the_client_disconnects():
+    assert await run_until_disconnect("GET") == "cancelled"
+
+
+async def test_writes_run_to_completion_when_the_client_disconnects():
+    assert await run_until_disconnect("POST") == "completed"
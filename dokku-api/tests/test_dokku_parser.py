@@ -0,0 +1,19 @@
+import pytest
+from dokku import dokku_parser
+
+
+@pytest.mark.parametrize(
+    "output, app_names",
+    [
+        ("=====> My Apps\napp-0\napp-1\n", ["app-0", "app-1"]),
+        ("app-0\napp-1", ["app-0", "app-1"]),
+        ("  =====> My Apps\n  app-0  \n\n  app-1\n", ["app-0", "app-1"]),
+        ("=====> My Apps\n!     You haven't deployed any applications yet\n", []),
+        ("=====> My Apps\napp-0\nDeprecated: apps:list will change\napp-1\n", ["app-0", "app-1"]),
+        ("=====> My Apps\napp-0\n-----> Plugin notice\n", ["app-0"]),
+        ("", []),
+        ("=====> My Apps", []),
+    ],
+)
+def test_parse_apps_list(output, app_names):
+    assert dokku_parser.parse_apps_list(output) == app_names
@@ -0,0 +1,34 @@
+import asyncio
+
+import pytest
+from utils import profile_utils
+
+pytestmark = pytest.mark.anyio
+
+
+def stream_app(release: asyncio.Event):
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/event-stream; charset=utf-8")]})
+        await release.wait()
+        await send({"type": "http.response.body", "body": b"data: done\n\n"})
+
+    return app
+
+
+async def test_streaming_response_frees_the_profiler(monkeypatch, tmp_path):
+    monkeypatch.setattr(profile_utils, "SLOW_REQUEST_PROFILE_MS", 1.0)
+    monkeypatch.setattr(profile_utils, "PROFILE_DIR", str(tmp_path))
+    release = asyncio.Event()
+    middleware = profile_utils.SlowRequestProfilerMiddleware(stream_app(release))
+    scope = {"type": "http", "method": "GET", "path": "/apps/app-0/logs/stream"}
+
+    async def send(message):
+        pass
+
+    request = asyncio.ensure_future(middleware(scope, None, send))
+    await asyncio.sleep(0.05)
+    assert profile_utils._profiling is False  # the next request can be profiled while the stream is open
+
+    release.set()
+    await request
+    assert profile_utils.list_profiles() == []
@@ -0,0 +1,20 @@
+import pytest
+from dokku import dokku_client
+from exceptions import DokkuUnavailableError
+from utils import snapshot_utils
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_refresh_refused_by_the_breaker_keeps_apps_dirty(fake_daemon):
+    refresher = snapshot_utils.SnapshotRefresher()
+    refresher._list_due = float("inf")
+    refresher.mark_dirty("app-0")
+    for _ in range(dokku_client.breaker.failure_threshold):
+        dokku_client.breaker.record_failure()
+
+    with pytest.raises(DokkuUnavailableError):
+        await refresher.refresh_due()
+
+    assert refresher._dirty == {"app-0"}
+    assert refresher._list_due == float("inf")  # not mistaken for a destroyed app